@@ -0,0 +1,232 @@
+import hmac
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger("skillup.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+# SQL kept per request for the slow request log
+MAX_LOGGED_QUERIES = 200
+
+# per sampled request: query count/time, cache hits/misses and, if slow
+# request logging is on, the statements themselves
+_request_record = ContextVar("instrumentation_request_record", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Counters and histograms keyed by metric name and label values.
+
+    Kept in process memory: with several worker processes each one reports
+    its own numbers, which Prometheus sums across scrape targets.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, buckets, labels, value):
+        with self.lock:
+            histogram = self.histograms.setdefault(name, {}).get(labels)
+            if histogram is None:
+                histogram = self.histograms[name][labels] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + value
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, series in sorted(self.histograms.items()):
+                lines += [f"# HELP {name} {METRIC_HELP[name]}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+            for name, series in sorted(self.counters.items()):
+                lines += [f"# HELP {name} {METRIC_HELP[name]}", f"# TYPE {name} counter"]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRIC_HELP = {
+    "skillup_http_request_duration_seconds": "Request latency by route",
+    "skillup_http_response_size_bytes": "Size of non-streaming response bodies",
+    "skillup_http_db_queries": "Database queries per sampled request",
+    "skillup_http_db_query_seconds_total": "Time spent in database queries by sampled requests",
+    "skillup_http_cache_requests_total": "Cache lookups by sampled requests, by cache alias and result",
+    "skillup_http_sampled_requests_total": "Requests whose queries and cache lookups were recorded",
+    "skillup_http_slow_requests_total": "Requests slower than INSTRUMENTATION_SLOW_REQUEST_SECONDS",
+}
+registry = Registry()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + [(key, value) for key, value in extra.items()]
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _record_query(execute, sql, params, many, context):
+    record = _request_record.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        record["queries"] += 1
+        record["query_seconds"] += duration
+        if record["statements"] is not None and len(record["statements"]) < MAX_LOGGED_QUERIES:
+            record["statements"].append((duration, sql))
+
+
+_MISSING = object()
+
+
+def _count_lookups(alias, cache):
+    # wraps this thread's backend instance once; the class is left alone
+    if getattr(cache, "_instrumented", False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        record = _request_record.get()
+        if record is not None:
+            record["cache"][(alias, "miss" if value is _MISSING else "hit")] += 1
+        return default if value is _MISSING else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        # BaseCache.get_many loops over self.get, which is counted_get by now
+        record = _request_record.get()
+        token = _request_record.set(None)
+        try:
+            values = get_many(keys, version=version)
+        finally:
+            _request_record.reset(token)
+        if record is not None:
+            record["cache"][(alias, "hit")] += len(values)
+            record["cache"][(alias, "miss")] += len(keys) - len(values)
+        return values
+
+    cache.get, cache.get_many, cache._instrumented = counted_get, counted_get_many, True
+
+
+class InstrumentationMiddleware:
+    """Per-route latency and response size for every request.
+
+    A sampled fraction of requests (INSTRUMENTATION_SAMPLE_RATE) also records
+    database query count and time and cache hits and misses. A sampled
+    request slower than INSTRUMENTATION_SLOW_REQUEST_SECONDS is logged to
+    skillup.slow_requests together with its SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "INSTRUMENTATION_SAMPLE_RATE", 1.0)
+        self.slow_seconds = getattr(settings, "INSTRUMENTATION_SLOW_REQUEST_SECONDS", None)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            start = time.perf_counter()
+            response = self.get_response(request)
+            self.finish(request, response, time.perf_counter() - start, None)
+            return response
+
+        record = {
+            "queries": 0,
+            "query_seconds": 0.0,
+            "cache": {(alias, result): 0 for alias in settings.CACHES for result in ("hit", "miss")},
+            "statements": [] if self.slow_seconds is not None else None,
+        }
+        for alias in settings.CACHES:
+            _count_lookups(alias, caches[alias])
+        token = _request_record.set(record)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_record_query))
+                response = self.get_response(request)
+        finally:
+            _request_record.reset(token)
+        self.finish(request, response, time.perf_counter() - start, record)
+        return response
+
+    def finish(self, request, response, duration, record):
+        match = request.resolver_match
+        route = match.view_name if match else "<unresolved>"
+        labels = (("route", route), ("method", request.method), ("status", response.status_code))
+        registry.observe("skillup_http_request_duration_seconds", LATENCY_BUCKETS, labels, duration)
+        if not response.streaming:
+            registry.observe("skillup_http_response_size_bytes", SIZE_BUCKETS, labels, len(response.content))
+        if record is None:
+            return
+        route_labels = (("route", route),)
+        registry.inc("skillup_http_sampled_requests_total", route_labels)
+        registry.observe("skillup_http_db_queries", QUERY_COUNT_BUCKETS, route_labels, record["queries"])
+        registry.inc("skillup_http_db_query_seconds_total", route_labels, record["query_seconds"])
+        for (alias, result), count in record["cache"].items():
+            if count:
+                registry.inc("skillup_http_cache_requests_total",
+                             route_labels + (("cache", alias), ("result", result)), count)
+        if self.slow_seconds is not None and duration >= self.slow_seconds:
+            registry.inc("skillup_http_slow_requests_total", route_labels)
+            logger.warning(
+                "Slow request %s %s (%s) took %.3fs, %d queries in %.3fs\n%s",
+                request.method, request.get_full_path(), route, duration, record["queries"], record["query_seconds"],
+                "\n".join(f"  {seconds * 1000:.1f}ms {sql}" for seconds, sql in record["statements"]),
+            )
+
+
+def metrics_view(request):
+    """Prometheus text format; staff sessions or "Authorization: Bearer $METRICS_TOKEN"."""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    authorization = request.headers.get("Authorization", "")
+    allowed = request.user.is_staff or (
+        token and hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
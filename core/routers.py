@@ -0,0 +1,67 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = "replica"
+STICKY_COOKIE = "read_primary"
+
+# per request: {"replica": reads may use the replica, "wrote": a write happened}
+_request_state = ContextVar("replica_request_state", default=None)
+
+
+class ReadReplicaRouter:
+    """Send reads from safe-method requests to the replica, everything else to the primary.
+
+    Outside a request (commands, the sweeper, tests) nothing goes to the
+    replica. Within a request the first write pins the rest of it to the
+    primary, so it reads what it just wrote.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state and state["replica"] and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state:
+            state["replica"] = False
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema through replication (or a file copy locally)
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReadReplicaMiddleware:
+    """Enable replica reads for GET/HEAD/OPTIONS requests.
+
+    After a request that wrote, the client gets a short-lived cookie that
+    keeps its reads on the primary until replication has caught up.
+    """
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {
+            "replica": request.method in self.SAFE_METHODS and STICKY_COOKIE not in request.COOKIES,
+            "wrote": False,
+        }
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        if state["wrote"]:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=settings.READ_REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite="Lax")
+        return response
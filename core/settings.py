@@ -1,6 +1,9 @@
+from datetime import timedelta
 from pathlib import Path
 import os
 
+from core.database import sqlite_database
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = "dev-secret-key-change-me"
@@ -22,7 +25,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "core.static_assets.PrecompressedStaticMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -37,13 +42,20 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "skillup" / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "skillup.context_processors.asset_version",
+            ],
+            # parse each template once per process; warm renders skip the loader
+            "loaders": [
+                ("django.template.loaders.cached.Loader", [
+                    "django.template.loaders.filesystem.Loader",
+                    "django.template.loaders.app_directories.Loader",
+                ]),
             ],
         },
     },
@@ -51,15 +63,86 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "core.wsgi.application"
 
+# SQLITE_PROFILE=default turns off the WAL/pragma tuning in core.database
+SQLITE_TUNED = os.environ.get("SQLITE_PROFILE", "tuned") == "tuned"
 DATABASES = {
+    "default": sqlite_database(BASE_DIR / "db.sqlite3", tuned=SQLITE_TUNED),
+}
+
+# Point READ_REPLICA_NAME at a replica of db.sqlite3 (locally: a copy of the
+# file) to serve reads of GET/HEAD/OPTIONS requests from it.
+if os.environ.get("READ_REPLICA_NAME"):
+    DATABASES["replica"] = sqlite_database(os.environ["READ_REPLICA_NAME"], tuned=SQLITE_TUNED)
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["core.routers.ReadReplicaRouter"]
+    MIDDLEWARE.insert(0, "core.routers.ReadReplicaMiddleware")
+# seconds a client keeps reading from the primary after it wrote something
+READ_REPLICA_STICKY_SECONDS = 5
+
+# Request metrics, exposed at /metrics/ (see core.instrumentation). Every
+# request's latency is recorded; queries and cache lookups only for the
+# sampled fraction, and sampled requests slower than the threshold are logged
+# with their SQL. METRICS_TOKEN lets a scraper in without a staff session.
+INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get("INSTRUMENTATION_SAMPLE_RATE", "1.0"))
+INSTRUMENTATION_SLOW_REQUEST_SECONDS = (
+    float(os.environ["SLOW_REQUEST_SECONDS"]) if os.environ.get("SLOW_REQUEST_SECONDS") else None
+)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "skillup.slow_requests": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
+
+# Rendered task markdown. LocMemCache is LRU-bounded by MAX_ENTRIES but per
+# process; point MARKDOWN_CACHE_BACKEND/LOCATION at a shared backend (e.g. Redis
+# with maxmemory-policy allkeys-lru) to share it between workers.
+MARKDOWN_CACHE_BACKEND = os.environ.get("MARKDOWN_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+
+# Sessions, session users and the users version behind the task ETags are
+# written through to the default cache, so every worker process has to see
+# the same one: with WEB_CONCURRENCY above 1 (gunicorn's worker count), point
+# DEFAULT_CACHE_BACKEND/LOCATION at Redis or Memcached. The skillup.E001
+# system check refuses a per-process LocMemCache there.
+DEFAULT_CACHE_BACKEND = os.environ.get("DEFAULT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache")
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+        "BACKEND": DEFAULT_CACHE_BACKEND,
+        "LOCATION": os.environ.get("DEFAULT_CACHE_LOCATION", ""),
+    },
+    "markdown": {
+        "BACKEND": MARKDOWN_CACHE_BACKEND,
+        "LOCATION": os.environ.get("MARKDOWN_CACHE_LOCATION", "markdown"),
+        "TIMEOUT": None,
+    },
 }
+if MARKDOWN_CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["markdown"]["OPTIONS"] = {"MAX_ENTRIES": int(os.environ.get("MARKDOWN_CACHE_MAX_ENTRIES", "500"))}
+MARKDOWN_CACHE_ALIAS = "markdown"
 
 AUTH_PASSWORD_VALIDATORS = []
 
+# Sessions and the session's user are read from the cache, with the database
+# behind them on a miss, so an authenticated request costs no queries.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+AUTHENTICATION_BACKENDS = ["skillup.backends.CachedModelBackend"]
+
+# Registration and HybridLoginView hash passwords in a process pool so the
+# PBKDF2 work does not run on request threads. 0 hashes inline. Every web
+# worker process starts its own pool, so the default splits the host's CPUs
+# between the WEB_CONCURRENCY workers instead of giving each all of them.
+PASSWORD_HASHING_WORKERS = int(
+    os.environ.get("PASSWORD_HASHING_WORKERS", max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))
+)
+PASSWORD_HASHING_QUEUE_PER_WORKER = 4
+PASSWORD_HASHING_WAIT = 5
+
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
 USE_I18N = True
@@ -68,6 +151,18 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "skillup" / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
+# collectstatic only copies the assets templates reference, fingerprints them
+# and writes .gz/.br copies; see core.static_assets
+STATICFILES_FINDERS = [
+    "core.static_assets.ReferencedFileSystemFinder",
+    "core.static_assets.ExternalAppDirectoriesFinder",
+]
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    # uploaded markdown, stored once per distinct content
+    "markdown": {"BACKEND": "skillup.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "core.static_assets.CompressedManifestStaticFilesStorage"},
+}
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -75,10 +170,20 @@ AUTH_USER_MODEL = "skillup.User"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
+        "rest_framework_simplejwt.authentication.JWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
 }
+
+# Short-lived access tokens: TaskViewSet and the profile endpoint trust their
+# claims without loading the user. Only access tokens carry those claims and
+# the refresh serializer reads them from the user again, so staff/profile
+# changes apply within ACCESS_TOKEN_LIFETIME.
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),
+    "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
+    "TOKEN_REFRESH_SERIALIZER": "skillup.tokens.TokenRefreshSerializer",
+}
@@ -0,0 +1,206 @@
+"""Fingerprinted, precompressed static files.
+
+collectstatic only picks up the files of the project's own static
+directories that templates reference through {% static %} (plus whatever
+those pull in through url(), @import and source maps), hashes their names and
+writes .gz and .br copies next to them (without the brotli package from
+requirements.txt, only .gz). PrecompressedStaticMiddleware then serves the smallest variant the
+client accepts, with far-future immutable caching for hashed names.
+"""
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.finders import AppDirectoriesFinder, FileSystemFinder
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants only
+    brotli = None
+
+STATIC_TAG = re.compile(r"""{%\s*static\s+['"]([^'"]+)['"]\s*%}""")
+CSS_REFERENCE = re.compile(r"""url\(\s*['"]?([^'")]+)['"]?\s*\)|@import\s+['"]([^'"]+)['"]""")
+SOURCE_MAP = re.compile(r"""sourceMappingURL=([^\s*'"]+)""")
+COMPRESSIBLE = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map", ".ttf", ".eot", ".ico"}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=60"
+
+
+def _template_dirs():
+    for engine in settings.TEMPLATES:
+        yield from (Path(directory) for directory in engine.get("DIRS", []))
+
+
+def _asset_references(name, source):
+    base = posixpath.dirname(name)
+    urls = [match.group(1) for match in SOURCE_MAP.finditer(source)]
+    if name.endswith(".css"):
+        urls += [match.group(1) or match.group(2) for match in CSS_REFERENCE.finditer(source)]
+    for url in urls:
+        url = url.strip()
+        if url.startswith(("data:", "http:", "https:", "//", "#", "/")):
+            continue
+        url = re.split(r"[?#]", url, maxsplit=1)[0]
+        if url:
+            yield posixpath.normpath(posixpath.join(base, url))
+
+
+@lru_cache(maxsize=None)
+def referenced_assets():
+    """Static paths used by the templates, and the files their CSS and source maps depend on."""
+    pending = set()
+    for directory in _template_dirs():
+        for template in directory.rglob("*.html"):
+            pending.update(STATIC_TAG.findall(template.read_text(encoding="utf-8", errors="ignore")))
+
+    found = set()
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        path = finders.find(name)
+        if not path:
+            continue
+        found.add(name)
+        if name.endswith((".css", ".js")):
+            with open(path, encoding="utf-8", errors="ignore") as f:
+                pending.update(_asset_references(name, f.read()))
+    return frozenset(found)
+
+
+class ReferencedFileSystemFinder(FileSystemFinder):
+    """STATICFILES_DIRS, but collectstatic only lists referenced files."""
+
+    def list(self, ignore_patterns):
+        referenced = referenced_assets()
+        for path, storage in super().list(ignore_patterns):
+            if path.replace(os.sep, "/") in referenced:
+                yield path, storage
+
+
+class ExternalAppDirectoriesFinder(AppDirectoriesFinder):
+    """App static dirs (admin, DRF, swagger) minus those already covered by STATICFILES_DIRS."""
+
+    def list(self, ignore_patterns):
+        own_dirs = {Path(directory).resolve() for directory in settings.STATICFILES_DIRS}
+        for path, storage in super().list(ignore_patterns):
+            if Path(storage.location).resolve() not in own_dirs:
+                yield path, storage
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # templates may reference files that were never collected; render the
+    # plain URL instead of failing the page
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert(matchobj):
+            try:
+                return converter(matchobj)
+            except ValueError:
+                # dangling reference, e.g. a source map that was never shipped
+                return matchobj.group(0)
+
+        return convert
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                self._write_compressed(self.path(name))
+
+    @staticmethod
+    def _write_compressed(path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data)))
+        for suffix, compressed in variants:
+            if len(compressed) < len(data):
+                with open(path + suffix, "wb") as f:
+                    f.write(compressed)
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticMiddleware:
+    """Serve collected files from STATIC_ROOT, picking the .br/.gz copy when accepted."""
+
+    ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = str(settings.STATIC_ROOT)
+
+    @property
+    def immutable_names(self):
+        # hashed names from the manifest; loaded once per process
+        if not hasattr(self, "_immutable_names"):
+            self._immutable_names = frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._immutable_names
+
+    def __call__(self, request):
+        if request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return self.get_response(request)
+        if not os.path.isfile(path):
+            return self.get_response(request)
+
+        stat = os.stat(path)
+        if not was_modified_since(request.headers.get("If-Modified-Since"), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+            serve_path, encoding = path, None
+            for coding, suffix in self.ENCODINGS:
+                if coding in accepted and os.path.isfile(path + suffix):
+                    serve_path, encoding = path + suffix, coding
+                    break
+            response = FileResponse(open(serve_path, "rb"), content_type=content_type)
+            if encoding:
+                response["Content-Encoding"] = encoding
+            response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Vary"] = "Accept-Encoding"
+        response["Cache-Control"] = IMMUTABLE if name in self.immutable_names else REVALIDATE
+        return response
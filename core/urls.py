@@ -3,6 +3,8 @@ from django.urls import path, include
 
 from rest_framework import permissions
 
+from core.instrumentation import metrics_view
+
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
@@ -18,6 +20,7 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),
 
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 
@@ -1,18 +1,62 @@
-from django.contrib import admin
-from django.shortcuts import get_object_or_404, redirect
+from django.contrib import admin, messages
+from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.html import format_html
 from django.urls import reverse
 
+from . import search
 from .models import User, Task, MarkdownFile, ModifiedMarkdownFile, SubmittedMarkdownFile
-from .admin_forms import ModifiedMarkdownFileForm
+from .admin_forms import ModifiedMarkdownFileForm, BulkAssignForm, UserImportForm
+from .assignment import bulk_assign
+from .review import review_tasks
+from .user_import import import_users, read_rows, text_stream
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/user_changelist.html'
+    list_filter = ('department', 'lab_part')
+    search_fields = ('knox_id',)
+
+    # shown in the admin message; the rest are only counted
+    MAX_REPORTED_ERRORS = 20
+
+    def get_urls(self):
+        from django.urls import path
+        urls = super().get_urls()
+        custom_urls = [
+            path('import/', self.admin_site.admin_view(self.import_view), name='skillup_user_import'),
+        ]
+        return custom_urls + urls
+
+    def import_view(self, request):
+        form = UserImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            errors = []
+
+            def on_error(line_no, message):
+                if len(errors) < self.MAX_REPORTED_ERRORS:
+                    errors.append(f'line {line_no}: {message}')
+
+            report = import_users(read_rows(text_stream(upload.file), upload.import_format),
+                                  update_passwords=form.cleaned_data['update_passwords'], on_error=on_error)
+            self.message_user(request, f"{report['created']} users created, {report['updated']} updated")
+            if report['invalid']:
+                self.message_user(request, f"{report['invalid']} invalid rows skipped: {'; '.join(errors)}",
+                                  level=messages.WARNING)
+            return redirect('admin:skillup_user_changelist')
+        return render(request, 'admin/user_import.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Import users',
+            'form': form,
+        })
 
 
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'assigned_to', 'status', 'review_status', 'review_actions')
     list_filter = ('status', 'review_status', 'assigned_to')
+    actions = ['mark_selected_pass', 'mark_selected_fail']
 
     def review_actions(self, obj):
         if obj.status == 'done':
@@ -39,17 +83,33 @@ class TaskAdmin(admin.ModelAdmin):
     def mark_pass(self, request, task_id):
         task = get_object_or_404(Task, pk=task_id)
         task.review_status = 'passed'
-        task.save()
+        task.save(update_fields=['review_status', 'updated_at'])
         self.message_user(request, f'Task {task.title} marked as PASSED')
         return redirect('admin:skillup_task_changelist')
 
     def mark_fail(self, request, task_id):
         task = get_object_or_404(Task, pk=task_id)
         task.review_status = 'failed'
-        task.save()
+        task.save(update_fields=['review_status', 'updated_at'])
         self.message_user(request, f'Task {task.title} marked as FAILED')
         return redirect('admin:skillup_task_changelist')
 
+    def _review_selected(self, request, queryset, review_status):
+        results = review_tasks(queryset.values_list('id', flat=True), review_status)
+        updated = sum(1 for result in results.values() if result == 'updated')
+        self.message_user(request, f'{updated} tasks marked as {review_status.upper()}')
+        if updated < len(results):
+            self.message_user(request, f'{len(results) - updated} selected tasks are not done and were skipped',
+                              level=messages.WARNING)
+
+    @admin.action(description='Mark selected done tasks as PASSED')
+    def mark_selected_pass(self, request, queryset):
+        self._review_selected(request, queryset, 'passed')
+
+    @admin.action(description='Mark selected done tasks as FAILED')
+    def mark_selected_fail(self, request, queryset):
+        self._review_selected(request, queryset, 'failed')
+
     def get_changeform_initial_data(self, request):
         initial = super().get_changeform_initial_data(request)
         submitted_file_id = request.GET.get('submitted_file')
@@ -60,16 +120,20 @@ class TaskAdmin(admin.ModelAdmin):
 
 @admin.register(MarkdownFile)
 class MarkdownFileAdmin(admin.ModelAdmin):
-    list_display = ('id', 'title', 'upload_at', 'view_content', 'modify_button')
+    list_display = ('id', 'title', 'upload_at', 'size', 'line_count', 'view_content', 'modify_button')
     search_fields = ('title',)
     list_filter = ('upload_at',)
-    readonly_fields = ('upload_at',)
+    readonly_fields = ('upload_at', 'size', 'line_count')
+
+    def get_search_results(self, request, queryset, search_term):
+        # title and content through the full-text index instead of LIKE '%...%'
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_matching(queryset, search_term), False
 
     def view_content(self, obj):
         if obj.file:
-            with obj.file.open('r') as f:
-                content = f.read()
-            return format_html('<pre>{}</pre>', content[:500])
+            return format_html('<pre>{}</pre>', obj.preview)
         return 'No content available'
 
     def modify_button(self, obj):
@@ -83,9 +147,10 @@ class MarkdownFileAdmin(admin.ModelAdmin):
 @admin.register(ModifiedMarkdownFile)
 class ModifiedMarkdownFileAdmin(admin.ModelAdmin):
     form = ModifiedMarkdownFileForm
-    list_display = ('id', 'original_file', 'modified_by', 'modified_at',
-                    'view_modified_content', 'submit_button')
-    readonly_fields = ('modified_at', 'modified_file')
+    list_display = ('id', 'original_file', 'modified_by', 'modified_at', 'size', 'line_count', 'stored_as',
+                    'view_modified_content', 'diff_link', 'submit_button')
+    list_select_related = ('original_file', 'modified_by')
+    readonly_fields = ('modified_at', 'modified_file', 'size', 'line_count')
     search_fields = ('original_file__title', 'modified_by__knox_id')
     list_filter = ('modified_at',)
 
@@ -93,18 +158,32 @@ class ModifiedMarkdownFileAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs.exclude(submittedmarkdownfile__isnull=False)
 
+    def get_search_results(self, request, queryset, search_term):
+        # original title, author knox_id and content through the full-text index
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return search.filter_matching(queryset, search_term), False
+
     def view_modified_content(self, obj):
-        if obj.modified_file:
-            with obj.modified_file.open('r') as f:
-                content = f.read()
-            return format_html('<pre>{}</pre>', content[:500])
+        if obj.has_content():
+            return format_html('<pre>{}</pre>', obj.preview)
         return 'No modified content available'
 
     def submit_button(self, obj):
         url = reverse('admin:skillup_submittedmarkdownfile_add') + f'?modified_file={obj.id}'
         return format_html('<a class="button" href="{}">Submit</a>', url)
 
+    def stored_as(self, obj):
+        return 'Delta' if obj.delta else 'Full copy'
+
+    def diff_link(self, obj):
+        if not obj.has_content():
+            return '-'
+        url = reverse('modified-md-files-diff', args=[obj.pk])
+        return format_html('<a class="button" href="{}">Diff</a>', url)
+
     view_modified_content.short_description = 'Modified Content'
+    diff_link.short_description = 'Diff'
     submit_button.short_description = 'Submit'
 
     def get_changeform_initial_data(self, request):
@@ -119,10 +198,57 @@ class ModifiedMarkdownFileAdmin(admin.ModelAdmin):
 
 @admin.register(SubmittedMarkdownFile)
 class SubmitMarkdownFileAdmin(admin.ModelAdmin):
-    list_display = ('id', 'modified_file', 'submitted_at', 'view_submitted_content', 'assigned_button')
+    list_display = ('id', 'modified_file', 'submitted_at', 'view_submitted_content', 'assigned_button',
+                    'bulk_assign_button')
+    list_select_related = ('modified_file__original_file', 'modified_file__modified_by')
     search_fields = ('modified_file__original_file__title',)
     list_filter = ('submitted_at',)
     readonly_fields = ('submitted_at',)
+    actions = ['assign_to_cohort']
+
+    def get_urls(self):
+        from django.urls import path
+        urls = super().get_urls()
+        custom_urls = [
+            path('<int:submitted_id>/bulk_assign/', self.admin_site.admin_view(self.bulk_assign_view),
+                 name='submittedmarkdownfile_bulk_assign'),
+        ]
+        return custom_urls + urls
+
+    def bulk_assign_view(self, request, submitted_id):
+        submitted_file = get_object_or_404(
+            SubmittedMarkdownFile.objects.select_related('modified_file__original_file'), pk=submitted_id
+        )
+        form = BulkAssignForm(request.POST or None)
+        if request.method == 'POST' and form.is_valid():
+            data = form.cleaned_data
+            result = bulk_assign(
+                submitted_file,
+                department=data['department'], lab_part=data['lab_part'], project=data['project'],
+                knox_ids=data['knox_ids'], title=data['title'] or None,
+                description=data['description'] or None, time_limit_minutes=data['time_limit_minutes'],
+            )
+            self.message_user(
+                request,
+                f"{result['created']} tasks created, {result['skipped']} students already had this task"
+            )
+            if result['unmatched_knox_ids']:
+                self.message_user(request, f"No active user for: {', '.join(result['unmatched_knox_ids'])}",
+                                  level=messages.WARNING)
+            return redirect('admin:skillup_task_changelist')
+        return render(request, 'admin/bulk_assign.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Assign to cohort',
+            'submitted_file': submitted_file,
+            'form': form,
+        })
+
+    @admin.action(description='Assign selected file to a cohort')
+    def assign_to_cohort(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, 'Select exactly one submitted file to assign', level=messages.WARNING)
+            return None
+        return redirect('admin:submittedmarkdownfile_bulk_assign', queryset.get().pk)
 
     def get_changeform_initial_data(self, request):
         initial = super().get_changeform_initial_data(request)
@@ -134,15 +260,18 @@ class SubmitMarkdownFileAdmin(admin.ModelAdmin):
         return initial
 
     def view_submitted_content(self, obj):
-        if obj.modified_file and obj.modified_file.modified_file:
-            with obj.modified_file.modified_file.open('r') as f:
-                content = f.read()
-            return format_html('<pre>{}</pre>', content[:500])
+        if obj.modified_file and obj.modified_file.has_content():
+            return format_html('<pre>{}</pre>', obj.modified_file.preview)
         return 'No final content available'
 
     def assigned_button(self, obj):
         url = reverse('admin:skillup_task_add') + f'?submitted_file={obj.id}'
         return format_html('<a href="{}">Assign to Student</a>', url)
 
+    def bulk_assign_button(self, obj):
+        url = reverse('admin:submittedmarkdownfile_bulk_assign', args=[obj.id])
+        return format_html('<a href="{}">Assign to Cohort</a>', url)
+
     view_submitted_content.short_description = 'Submitted Markdown Preview'
     assigned_button.short_description = 'Assign to Student'
+    bulk_assign_button.short_description = 'Assign to Cohort'
@@ -1,8 +1,42 @@
 from django import forms
-from .models import ModifiedMarkdownFile
+from .models import User, ModifiedMarkdownFile
 
 
 class ModifiedMarkdownFileForm(forms.ModelForm):
     class Meta:
         model = ModifiedMarkdownFile
         fields = ["original_file", "modified_file"]
+
+
+class BulkAssignForm(forms.Form):
+    department = forms.ChoiceField(choices=[('', '---------')] + User.DEPARTMENT_CHOICES, required=False)
+    lab_part = forms.ChoiceField(choices=[('', '---------')] + User.LAB_PART_CHOICES, required=False)
+    project = forms.CharField(max_length=255, required=False)
+    knox_ids = forms.CharField(widget=forms.Textarea, required=False,
+                               help_text='Knox IDs separated by commas, spaces or new lines')
+    title = forms.CharField(max_length=100, required=False, help_text='Defaults to the markdown file title')
+    description = forms.CharField(max_length=255, required=False)
+    time_limit_minutes = forms.IntegerField(min_value=1, initial=30)
+
+    def clean_knox_ids(self):
+        return self.cleaned_data['knox_ids'].replace(',', ' ').split()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(key) for key in ('department', 'lab_part', 'project', 'knox_ids')):
+            raise forms.ValidationError('Select users by department, lab part, project or knox IDs')
+        return cleaned_data
+
+
+class UserImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, or JSONL; columns: knox_id, email, department, '
+                                     'lab_part, project, password')
+    update_passwords = forms.BooleanField(required=False, help_text='Also replace passwords of existing users')
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        fmt = upload.name.rsplit('.', 1)[-1].lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise forms.ValidationError('Upload a .csv or .jsonl file')
+        upload.import_format = fmt
+        return upload
@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     TaskViewSet, UserRegistrationViewSet, get_user_profile,
     MarkdownFileViewSet, ModifiedMarkdownFileViewSet, SubmittedMarkdownFileViewSet,
-    task_detail_view, HybridLoginView, login_view
+    markdown_search, task_detail_view, task_markdown_stream_view, task_markdown_sections_view, task_markdown_section_view,
+    HybridLoginView, login_view, markdown_cache_stats, task_stats
 )
 
 router = DefaultRouter()
@@ -20,5 +22,13 @@ urlpatterns = [
     path('', login_view, name='login'),
     path('users/profile/', get_user_profile, name='user-profile'),
     path('task/detail/<int:pk>/', task_detail_view, name='task_detail_api'),
+    path('task/detail/<int:pk>/markdown/', task_markdown_stream_view, name='task-markdown-stream'),
+    path('task/detail/<int:pk>/markdown/sections/', task_markdown_sections_view, name='task-markdown-sections'),
+    path('task/detail/<int:pk>/markdown/sections/<int:section>/', task_markdown_section_view,
+         name='task-markdown-section'),
+    path('api/admin/markdown-cache-stats/', markdown_cache_stats, name='markdown-cache-stats'),
+    path('api/admin/task-stats/', task_stats, name='task-stats'),
+    path('api/admin/markdown-search/', markdown_search, name='markdown-search'),
     path('hybrid-login/', HybridLoginView.as_view(), name='hybrid-login'),
+    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
 ]
@@ -0,0 +1,51 @@
+from django.db import transaction
+
+from .models import User, Task
+
+BATCH_SIZE = 500
+
+
+def select_users(department=None, lab_part=None, project=None, knox_ids=None):
+    users = User.objects.filter(is_active=True)
+    if department:
+        users = users.filter(department=department)
+    if lab_part:
+        users = users.filter(lab_part=lab_part)
+    if project:
+        users = users.filter(project=project)
+    if knox_ids:
+        users = users.filter(knox_id__in=knox_ids)
+    return users
+
+
+def bulk_assign(submitted_file, department=None, lab_part=None, project=None, knox_ids=None,
+                title=None, description=None, time_limit_minutes=None):
+    """Give submitted_file to every matching user in one transaction.
+
+    Users that already have a task for this file are skipped, so re-running
+    an assignment for a cohort only picks up the newcomers.
+    """
+    if title is None:
+        title = submitted_file.modified_file.original_file.title
+    task_fields = {'title': title, 'description': description, 'submitted_file': submitted_file}
+    if time_limit_minutes is not None:
+        task_fields['time_limit_minutes'] = time_limit_minutes
+
+    users = select_users(department, lab_part, project, knox_ids)
+    # read and insert in one transaction, so a concurrent assignment of the
+    # same file can't create a task between the "already" check and ours
+    with transaction.atomic():
+        matched = dict(users.values_list('id', 'knox_id'))
+        already = set(
+            Task.objects.filter(submitted_file=submitted_file, assigned_to_id__in=users.values('id'))
+            .values_list('assigned_to_id', flat=True)
+        )
+        new_tasks = [Task(assigned_to_id=user_id, **task_fields) for user_id in sorted(matched.keys() - already)]
+        Task.objects.bulk_create(new_tasks, batch_size=BATCH_SIZE)
+
+    return {
+        'matched': len(matched),
+        'created': len(new_tasks),
+        'skipped': len(already),
+        'unmatched_knox_ids': sorted(set(knox_ids or ()) - set(matched.values())),
+    }
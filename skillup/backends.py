@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_CACHE_KEY = 'auth-user:{}'
+USER_CACHE_TIMEOUT = 600
+# part of the task ETags, which embed assignee profiles
+USERS_VERSION_KEY = 'auth-user:version'
+
+
+def cache_user(user):
+    cache.set(USER_CACHE_KEY.format(user.pk), user, USER_CACHE_TIMEOUT)
+
+
+def forget_user(user_id):
+    cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+def forget_users(user_ids):
+    cache.delete_many([USER_CACHE_KEY.format(user_id) for user_id in user_ids])
+
+
+def users_version():
+    # seeded from the clock so an evicted counter never repeats an old value
+    return cache.get_or_set(USERS_VERSION_KEY, time.time_ns, None)
+
+
+def bump_users_version():
+    try:
+        cache.incr(USERS_VERSION_KEY)
+    except ValueError:
+        cache.set(USERS_VERSION_KEY, time.time_ns(), None)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend that resolves the session's user from the cache.
+
+    Entries are written through on login and whenever a User is saved or
+    deleted (see skillup.signals), and dropped by User.objects...update()
+    (see UserQuerySet); a miss falls back to the database. Raw SQL writes to
+    skillup_user bypass all of these, so a user deactivated that way keeps
+    authenticating until the entry expires after USER_CACHE_TIMEOUT.
+    """
+
+    def get_user(self, user_id):
+        key = USER_CACHE_KEY.format(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.db import close_old_connections, connections
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+
+@contextmanager
+def scratch_databases():
+    """Point every connection at throwaway test databases for the duration.
+
+    SQLite test databases are put in files rather than shared memory, whose
+    table-level locks would make any concurrent write fail immediately.
+    """
+    scratch_dir = tempfile.mkdtemp(prefix='skillup-bench-')
+    scratch_names = []
+    for connection in connections.all():
+        test_settings = connection.settings_dict['TEST']
+        if connection.vendor == 'sqlite' and not test_settings.get('NAME'):
+            test_settings['NAME'] = os.path.join(scratch_dir, f'{connection.alias}.sqlite3')
+            scratch_names.append(test_settings)
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+        for test_settings in scratch_names:
+            test_settings['NAME'] = None
+        for name in os.listdir(scratch_dir):
+            os.remove(os.path.join(scratch_dir, name))
+        os.rmdir(scratch_dir)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_load(fn, total, concurrency):
+    """Call fn(i) for i in range(total) from concurrency threads.
+
+    fn returns True on success; a False return or an exception counts as an
+    error. Returns throughput and latency percentiles in milliseconds.
+    """
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = fn(i)
+        except Exception:
+            ok = False
+        finally:
+            # what the request_finished handler does: honours CONN_MAX_AGE
+            close_old_connections()
+        return time.perf_counter() - start, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'requests': total,
+        'concurrency': concurrency,
+        'errors': sum(1 for _, ok in results if not ok),
+        'seconds': round(elapsed, 3),
+        'throughput': round(total / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 2) if latencies else None,
+    }
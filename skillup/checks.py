@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+@register(Tags.caches)
+def check_shared_default_cache(app_configs, **kwargs):
+    # logout, deactivation and password changes only reach the workers that share the cache
+    if getattr(settings, 'WEB_CONCURRENCY', 1) <= 1:
+        return []
+    if settings.CACHES['default']['BACKEND'] not in PER_PROCESS_CACHES:
+        return []
+    users = []
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db':
+        users.append('SESSION_ENGINE cached_db')
+    if 'skillup.backends.CachedModelBackend' in settings.AUTHENTICATION_BACKENDS:
+        users.append('CachedModelBackend')
+    if not users:
+        return []
+    return [Error(
+        f"{' and '.join(users)} need a default cache shared by all {settings.WEB_CONCURRENCY} workers",
+        hint='Set DEFAULT_CACHE_BACKEND and DEFAULT_CACHE_LOCATION to Redis or Memcached',
+        id='skillup.E001',
+    )]
@@ -0,0 +1,37 @@
+"""ETag and Last-Modified validators for the task and markdown endpoints.
+
+ETags are hashed from columns the request has to read anyway (Task.updated_at
+and status, the markdown content hash), so a matching If-None-Match is
+answered with 304 before anything is serialized, rendered or read from storage.
+
+The task endpoints send no Last-Modified: their responses also depend on
+deleted rows, the assignee profile and the markdown, none of which moves
+updated_at, so an If-Modified-Since check could answer 304 for a stale copy.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()[:32])
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 (or 412) to send if the client's copy is current, otherwise None."""
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    return set_validators(response, etag, last_modified) if response is not None else None
+
+
+def set_validators(response, etag, last_modified=None):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(_timestamp(last_modified))
+    # per-user content; make browsers revalidate rather than reuse it blindly
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
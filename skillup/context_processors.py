@@ -0,0 +1,7 @@
+from django.contrib.staticfiles.storage import staticfiles_storage
+
+
+def asset_version(request):
+    # changes whenever collectstatic produces new hashed names, so cached
+    # template fragments never point at stale asset URLs
+    return {'asset_version': getattr(staticfiles_storage, 'manifest_hash', '')}
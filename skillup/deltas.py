@@ -0,0 +1,122 @@
+"""Line deltas of a modified markdown file against its original.
+
+A delta is a JSON list of [i1, i2, lines] ops, sorted by i1: original lines
+i1:i2 are replaced by lines, and everything between ops is copied from the
+original unchanged.
+"""
+import difflib
+import json
+
+ENCODING = 'utf-8'
+# keeps bytes that are not valid UTF-8 round-tripping through the JSON
+ERRORS = 'surrogateescape'
+
+
+def _read_lines(field_file):
+    if field_file._committed:
+        with field_file.open('rb'):
+            return [line.decode(ENCODING, ERRORS) for line in field_file]
+    return [line.decode(ENCODING, ERRORS) for line in field_file]
+
+
+def compute_ops(base_file, modified_file):
+    base, modified = _read_lines(base_file), _read_lines(modified_file)
+    matcher = difflib.SequenceMatcher(None, base, modified)
+    return [[i1, i2, modified[j1:j2]] for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def encode(ops):
+    return json.dumps(ops, separators=(',', ':'))
+
+
+def decode(delta):
+    return json.loads(delta)
+
+
+def iter_lines(base_file, ops):
+    """Yield the modified file line by line while streaming the original."""
+    with base_file.open('rb'):
+        lines = iter(base_file)
+        position = 0
+        for i1, i2, new_lines in ops:
+            for _ in range(i1 - position):
+                yield next(lines)
+            for _ in range(i2 - i1):
+                next(lines)
+            for line in new_lines:
+                yield line.encode(ENCODING, ERRORS)
+            position = i2
+        yield from lines
+
+
+def _range(start, length):
+    # same hunk range format as difflib.unified_diff
+    beginning = start + 1
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def _display(line):
+    if isinstance(line, bytes):
+        text = line.decode(ENCODING, 'replace')
+    else:
+        text = line.encode(ENCODING, ERRORS).decode(ENCODING, 'replace')
+    return text if text.endswith('\n') else text + '\n'
+
+
+def iter_unified_diff(base_file, ops, fromfile='', tofile='', context=3):
+    """Unified diff of the ops against the original.
+
+    Only the original is read, once and in order; the modified side comes
+    from the ops, so neither file is ever held in memory whole.
+    """
+    groups = []
+    for op in ops:
+        if groups and op[0] - groups[-1][-1][1] <= 2 * context:
+            groups[-1].append(op)
+        else:
+            groups.append([op])
+    if not groups:
+        return
+    yield f'--- {fromfile}\n+++ {tofile}\n'
+    shift = 0
+    with base_file.open('rb'):
+        lines = iter(base_file)
+        position = 0
+
+        def take(count):
+            nonlocal position
+            taken = []
+            if count > 0:
+                for line in lines:
+                    taken.append(line)
+                    if len(taken) == count:
+                        break
+            position += len(taken)
+            return taken
+
+        for group in groups:
+            start = max(0, group[0][0] - context)
+            take(start - position)
+            body, old_count, new_count = [], 0, 0
+            for i1, i2, new_lines in group:
+                for line in take(i1 - position):
+                    body.append(' ' + _display(line))
+                    old_count += 1
+                    new_count += 1
+                for line in take(i2 - i1):
+                    body.append('-' + _display(line))
+                    old_count += 1
+                for line in new_lines:
+                    body.append('+' + _display(line))
+                    new_count += 1
+            for line in take(group[-1][1] + context - position):
+                body.append(' ' + _display(line))
+                old_count += 1
+                new_count += 1
+            yield f'@@ -{_range(start, old_count)} +{_range(start + shift, new_count)} @@\n'
+            yield from body
+            shift += sum(len(new_lines) - (i2 - i1) for i1, i2, new_lines in group)
@@ -0,0 +1,15 @@
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Func
+
+
+class Minutes(Func):
+    """An integer expression read as a number of minutes."""
+    template = "(%(expressions)s * INTERVAL '1 minute')"
+    output_field = DurationField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite keeps durations as integer microseconds
+        return self.as_sql(compiler, connection, template='(%(expressions)s * 60000000)', **extra_context)
+
+
+def deadline_from(start):
+    return ExpressionWrapper(start + Minutes(F('time_limit_minutes')), output_field=DateTimeField())
@@ -0,0 +1,38 @@
+import hashlib
+from collections import namedtuple
+
+PREVIEW_CHARS = 500
+
+FileSummary = namedtuple('FileSummary', ['content_hash', 'size', 'line_count', 'preview'])
+
+EMPTY_SUMMARY = FileSummary(content_hash='', size=0, line_count=0, preview='')
+
+
+def _summarize_chunks(chunks):
+    digest = hashlib.sha256()
+    size = 0
+    line_count = 0
+    last_byte = b''
+    head = b''
+    # 4 bytes per character is the UTF-8 worst case
+    head_limit = PREVIEW_CHARS * 4
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+        line_count += chunk.count(b'\n')
+        last_byte = chunk[-1:]
+        if len(head) < head_limit:
+            head += chunk[:head_limit - len(head)]
+    if size and last_byte != b'\n':
+        line_count += 1
+    preview = head.decode('utf-8', errors='ignore')[:PREVIEW_CHARS]
+    return FileSummary(digest.hexdigest(), size, line_count, preview)
+
+
+def summarize(field_file):
+    """Hash, size, line count and preview of a FieldFile in a single read."""
+    if getattr(field_file, '_committed', False):
+        with field_file.open('rb'):
+            return _summarize_chunks(field_file.chunks())
+    # fresh upload: read it in place, the storage still has to save it
+    return _summarize_chunks(field_file.chunks())
@@ -0,0 +1,91 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class HashingPoolBusy(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_pool = None
+_slots = None
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _get_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', 0)
+            if not workers:
+                return None
+            _pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                        initargs=(os.environ['DJANGO_SETTINGS_MODULE'],))
+            # hashes queued or running; past this callers get HashingPoolBusy
+            _slots = threading.BoundedSemaphore(workers * getattr(settings, 'PASSWORD_HASHING_QUEUE_PER_WORKER', 4))
+        return _pool
+
+
+def shutdown():
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = _slots = None
+
+
+def submit(fn, *args, timeout=None):
+    """Run fn(*args) in the hashing pool and return a Future.
+
+    Waits at most timeout seconds (PASSWORD_HASHING_WAIT by default) for a
+    free slot. With PASSWORD_HASHING_WORKERS = 0 fn runs on the calling thread.
+    """
+    pool = _get_pool()
+    if pool is None:
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+    if timeout is None:
+        timeout = getattr(settings, 'PASSWORD_HASHING_WAIT', 5)
+    slots = _slots
+    if not slots.acquire(timeout=timeout):
+        raise HashingPoolBusy('password hashing pool is saturated')
+    try:
+        future = pool.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def hash_password(raw_password):
+    return submit(hashers.make_password, raw_password).result()
+
+
+def verify_password(raw_password, encoded, setter=None):
+    """hashers.verify_password in the pool; setter(raw_password) runs here when the hash is outdated."""
+    is_correct, must_update = submit(hashers.verify_password, raw_password, encoded).result()
+    if setter and is_correct and must_update:
+        setter(raw_password)
+    return is_correct
+
+
+def hash_passwords(raw_passwords):
+    """Hash a batch of passwords across every pool worker, in order."""
+    pool = _get_pool()
+    if pool is None:
+        return [hashers.make_password(raw_password) for raw_password in raw_passwords]
+    workers = getattr(settings, 'PASSWORD_HASHING_WORKERS', 1)
+    chunksize = max(1, len(raw_passwords) // (workers * 4))
+    return list(pool.map(hashers.make_password, raw_passwords, chunksize=chunksize))
+
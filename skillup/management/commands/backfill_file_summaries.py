@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from skillup.models import MarkdownFile, ModifiedMarkdownFile
+
+
+class Command(BaseCommand):
+    help = 'Compute content hash, size, line count and preview for markdown files saved before they were stored'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Recompute every row, not only missing ones')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        for model in (MarkdownFile, ModifiedMarkdownFile):
+            # rows with a file, or with a delta in place of one
+            with_content = Q(**{f'{model.summarized_field}__gt': ''})
+            if model is ModifiedMarkdownFile:
+                with_content |= ~Q(delta='')
+            queryset = model.objects.filter(with_content).order_by('pk')
+            if not options['all']:
+                queryset = queryset.filter(content_hash='')
+            done = missing = 0
+            for obj in queryset.iterator(chunk_size=options['chunk_size']):
+                try:
+                    obj.refresh_summary()
+                except FileNotFoundError:
+                    missing += 1
+                    field_file = getattr(obj, model.summarized_field)
+                    self.stderr.write(f'{model.__name__} {obj.pk}: {field_file.name} not found')
+                    continue
+                done += 1
+            self.stdout.write(self.style.SUCCESS(f'{model.__name__}: {done} updated, {missing} missing files'))
@@ -0,0 +1,188 @@
+import json
+import random
+import urllib.error
+import urllib.request
+from http.cookiejar import CookieJar
+from itertools import cycle
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+
+from skillup.benchmarking import run_load
+from skillup.models import MarkdownFile, Task, User
+
+SCENARIOS = ('login', 'task_list', 'task_detail', 'task_flow', 'admin_tasks', 'admin_markdown')
+
+
+class HttpSession:
+    """The subset of the test client the scenarios use, against a running server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def request(self, method, path, data=None, headers=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers={
+            'Content-Type': 'application/json', **(headers or {}),
+        })
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+
+class ClientSession:
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data=None, headers=None):
+        extra = {f"HTTP_{key.upper().replace('-', '_')}": value for key, value in (headers or {}).items()}
+        if method == 'GET':
+            response = self.client.get(path, **extra)
+        else:
+            response = self.client.post(path, data or {}, content_type='application/json', **extra)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, body
+
+
+class Command(BaseCommand):
+    help = ('Drive login, task list/detail, start/submit/complete and admin changelists at a given '
+            'concurrency and print latency percentiles and throughput as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of a running server; defaults to the in-process test client')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                            help=f"Comma separated, from: {', '.join(SCENARIOS)}")
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--sessions', type=int, default=16, help='Logged-in students the requests rotate over')
+        parser.add_argument('--prefix', default='load-', help='knox_id prefix used by generate_fixtures')
+        parser.add_argument('--password', default='loadtest-password')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.new_session = (lambda: HttpSession(options['url'])) if options['url'] else ClientSession
+
+        students = list(User.objects.filter(knox_id__startswith=options['prefix'], is_staff=False)
+                        .order_by('?').values_list('pk', 'knox_id')[:options['sessions']])
+        if not students:
+            raise CommandError('No generated users found; run generate_fixtures first')
+        self.students = [(pk, self.log_in(knox_id)) for pk, knox_id in students]
+        self.admin = self.log_in(f"{options['prefix']}admin")[0]
+
+        report = {
+            'meta': {
+                'target': options['url'] or 'test-client',
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'sessions': len(self.students),
+                'users': User.objects.count(),
+                'tasks': Task.objects.count(),
+                'markdown_files': MarkdownFile.objects.count(),
+                'started_at': timezone.now().isoformat(),
+            },
+            'scenarios': {},
+        }
+        for name in scenarios:
+            # rows a scenario creates, removed so later runs see the same data
+            self.cleanups = []
+            try:
+                fn = getattr(self, f'scenario_{name}')()
+                report['scenarios'][name] = run_load(fn, options['requests'], options['concurrency'])
+            finally:
+                for cleanup in self.cleanups:
+                    cleanup()
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+
+    def log_in(self, knox_id):
+        session = self.new_session()
+        status, body = session.request('POST', '/hybrid-login/', {
+            'knox_id': knox_id, 'password': self.options['password'],
+        })
+        if status != 200:
+            raise CommandError(f'Logging in {knox_id} failed with {status}; was --password used for generate_fixtures?')
+        return session, {'Authorization': f"Bearer {json.loads(body)['access']}"}
+
+    def student(self, i):
+        return self.students[i % len(self.students)]
+
+    def scenario_login(self):
+        knox_ids = [knox_id for knox_id in User.objects.filter(knox_id__startswith=self.options['prefix'],
+                                                               is_staff=False)
+                    .order_by('?').values_list('knox_id', flat=True)[:self.options['requests']]]
+        knox_ids = cycle(knox_ids)
+
+        def login(i):
+            status, _ = self.new_session().request('POST', '/hybrid-login/', {
+                'knox_id': next(knox_ids), 'password': self.options['password'],
+            })
+            return status == 200
+        return login
+
+    def scenario_task_list(self):
+        def task_list(i):
+            _, (session, headers) = self.student(i)
+            status, _ = session.request('GET', '/api/tasks/?page_size=50', headers=headers)
+            return status == 200
+        return task_list
+
+    def scenario_task_detail(self):
+        task_ids = {pk: list(Task.objects.filter(assigned_to_id=pk).values_list('pk', flat=True)[:50])
+                    for pk, _ in self.students}
+
+        def task_detail(i):
+            pk, (session, _) = self.student(i)
+            if not task_ids[pk]:
+                return False
+            status, _ = session.request('GET', f'/task/detail/{self.rng.choice(task_ids[pk])}/')
+            return status == 200
+        return task_detail
+
+    def scenario_task_flow(self):
+        # fresh assigned tasks, one per request, so every start/submit/complete is a real transition
+        tasks = Task.objects.bulk_create(
+            Task(title='Load test task', assigned_to_id=self.student(i)[0], time_limit_minutes=60)
+            for i in range(self.options['requests'])
+        )
+        task_ids = [task.pk for task in tasks]
+        self.cleanups.append(lambda: self.delete_tasks(task_ids))
+
+        def task_flow(i):
+            _, (session, headers) = self.student(i)
+            for action, data in (('start', None), ('submit', {'time_taken': 120}), ('complete', None)):
+                status, _ = session.request('POST', f'/api/tasks/{task_ids[i]}/{action}/', data, headers=headers)
+                if status != 200:
+                    return False
+            return True
+        return task_flow
+
+    @staticmethod
+    def delete_tasks(task_ids, batch_size=500):
+        for start in range(0, len(task_ids), batch_size):
+            Task.objects.filter(pk__in=task_ids[start:start + batch_size]).delete()
+
+    def scenario_admin_tasks(self):
+        def admin_tasks(i):
+            status, _ = self.admin.request('GET', '/admin/skillup/task/')
+            return status == 200
+        return admin_tasks
+
+    def scenario_admin_markdown(self):
+        def admin_markdown(i):
+            status, _ = self.admin.request('GET', '/admin/skillup/markdownfile/')
+            return status == 200
+        return admin_markdown
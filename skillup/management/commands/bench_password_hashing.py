@@ -0,0 +1,46 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from skillup import hashing
+from skillup.benchmarking import run_load, scratch_databases
+
+
+class Command(BaseCommand):
+    help = 'Compare registration and login throughput with hashing inline vs in the hashing pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+
+    def handle(self, *args, **options):
+        total, concurrency = options['requests'], options['concurrency']
+        report = {}
+        with scratch_databases():
+            for mode, workers in (('inline', 0), ('pool', options['workers'])):
+                with override_settings(PASSWORD_HASHING_WORKERS=workers):
+                    hashing.shutdown()
+
+                    def register(i, mode=mode):
+                        response = Client().post('/api/auth/register/', {
+                            'knox_id': f'bench-{mode}-{i}', 'email': f'bench-{mode}-{i}@example.com',
+                            'password': 'bench-password',
+                        }, content_type='application/json')
+                        return response.status_code == 201
+
+                    def log_in(i, mode=mode):
+                        response = Client().post('/hybrid-login/', {
+                            'knox_id': f'bench-{mode}-{i}', 'password': 'bench-password',
+                        }, content_type='application/json')
+                        return response.status_code == 200
+
+                    report[mode] = {
+                        'workers': workers,
+                        'register': run_load(register, total, concurrency),
+                        'login': run_load(log_in, total, concurrency),
+                    }
+                    hashing.shutdown()
+        self.stdout.write(json.dumps(report, indent=2))
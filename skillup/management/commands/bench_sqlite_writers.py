@@ -0,0 +1,68 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from core.database import sqlite_database
+from skillup.benchmarking import run_load, scratch_databases
+from skillup.models import Task, User
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent write throughput and lock errors for the default and tuned SQLite profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--tasks', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        database = connections.settings['default']
+        if database['ENGINE'] != 'django.db.backends.sqlite3':
+            self.stderr.write('The default database is not SQLite')
+            return
+        original = dict(database)
+        report = {}
+        try:
+            for profile in ('default', 'tuned'):
+                connections.close_all()
+                database.clear()
+                database.update(original)
+                for key in ('PRAGMAS', 'OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS'):
+                    database.pop(key, None)
+                database.update(sqlite_database(original['NAME'], tuned=profile == 'tuned'))
+                database.setdefault('OPTIONS', {})
+                database.setdefault('CONN_MAX_AGE', 0)
+                database.setdefault('CONN_HEALTH_CHECKS', False)
+                with scratch_databases():
+                    report[profile] = self.run_profile(options)
+        finally:
+            connections.close_all()
+            database.clear()
+            database.update(original)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_profile(self, options):
+        user = User.objects.create_user('bench', 'bench@example.com', 'bench-password')
+        Task.objects.bulk_create(Task(title='bench', assigned_to=user) for _ in range(options['tasks']))
+        task_ids = list(Task.objects.values_list('id', flat=True))
+        lock_errors = []
+
+        def write(i):
+            # read-then-write inside one transaction, like a submit under load
+            try:
+                with transaction.atomic():
+                    task = Task.objects.get(pk=random.choice(task_ids))
+                    task.time_taken = i
+                    task.save(update_fields=['time_taken', 'updated_at'])
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                lock_errors.append(i)
+                return False
+            return True
+
+        result = run_load(write, options['requests'], options['concurrency'])
+        result['lock_error_rate'] = round(len(lock_errors) / options['requests'], 4)
+        return result
@@ -0,0 +1,74 @@
+import json
+import time
+
+import markdown  # type: ignore
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine, engines
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.functional import lazy
+
+from skillup.benchmarking import percentile
+from skillup.models import Task
+
+LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+class Command(BaseCommand):
+    help = 'Time index.html and task_detail.html renders with and without template and fragment caching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=200)
+        parser.add_argument('--sections', type=int, default=40, help='sections in the synthetic task markdown')
+
+    def handle(self, *args, **options):
+        text = '\n\n'.join(
+            f'## Step {i}\n\nRun `make step-{i}` and record the output.\n\n- check one\n- check two'
+            for i in range(options['sections'])
+        )
+        task = Task(id=1, title='bench', description='bench task', status='ongoing', updated_at=timezone.now())
+        pages = {
+            'index.html': lambda: {'asset_version': 'bench'},
+            'task_detail.html': lambda: {
+                'task': task,
+                'task_markdown': text,
+                'render_markdown': lazy(markdown.markdown, str)(text),
+                'time_limit': 60,
+                'is_review': False,
+            },
+        }
+        configured = engines['django']
+        engine_options = {'dirs': configured.engine.dirs, 'libraries': configured.get_templatetag_libraries({})}
+        cached_loaders = [('django.template.loaders.cached.Loader', LOADERS)]
+        modes = {
+            # what every request paid before: parse, then render everything
+            'uncached': (Engine(loaders=LOADERS, **engine_options), True),
+            'parsed_once': (Engine(loaders=cached_loaders, **engine_options), True),
+            'warm': (Engine(loaders=cached_loaders, **engine_options), False),
+        }
+        fragments = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-fragments'}
+        report = {}
+        with override_settings(CACHES={**settings.CACHES, 'template_fragments': fragments}):
+            cache = caches['template_fragments']
+            for name, build_context in pages.items():
+                report[name] = {}
+                for mode, (engine, clear_fragments) in modes.items():
+                    cache.clear()
+                    engine.get_template(name).render(Context(build_context()))
+                    timings = []
+                    for _ in range(options['renders']):
+                        if clear_fragments:
+                            cache.clear()
+                        start = time.perf_counter()
+                        engine.get_template(name).render(Context(build_context()))
+                        timings.append((time.perf_counter() - start) * 1000)
+                    timings.sort()
+                    report[name][mode] = {
+                        'renders': len(timings),
+                        'p50_ms': round(percentile(timings, 50), 3),
+                        'p95_ms': round(percentile(timings, 95), 3),
+                        'p99_ms': round(percentile(timings, 99), 3),
+                    }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from skillup.models import ModifiedMarkdownFile
+
+
+class Command(BaseCommand):
+    help = 'Replace full copies of modified markdown files with deltas against their original'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        queryset = (ModifiedMarkdownFile.objects.select_related('original_file')
+                    .filter(delta='').exclude(modified_file='').order_by('pk'))
+        converted = kept = missing = saved = 0
+        for modified in queryset.iterator(chunk_size=options['chunk_size']):
+            try:
+                result = modified.store_as_delta()
+            except FileNotFoundError:
+                missing += 1
+                self.stderr.write(f'ModifiedMarkdownFile {modified.pk}: file not found')
+                continue
+            if result is None:
+                kept += 1
+            else:
+                converted += 1
+                saved += result
+        self.stdout.write(self.style.SUCCESS(
+            f'{converted} converted, {kept} kept in full, {missing} missing files, {saved} bytes saved'
+        ))
+        if converted:
+            self.stdout.write('Run gc_blobs to delete the copies nothing references any more')
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from skillup.transitions import expire_overdue
+
+
+class Command(BaseCommand):
+    help = 'Mark ongoing tasks whose deadline has passed as failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and sweep every INTERVAL seconds (default: sweep once and exit)')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = sum(expire_overdue(batch_size=options['batch_size']))
+            self.stdout.write(f'{expired} overdue tasks marked as failed')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from skillup.models import StoredBlob
+from skillup.storage import BLOB_DIR, markdown_storage, recount_references, stored_file_fields
+
+
+class Command(BaseCommand):
+    help = 'Delete stored markdown files that no row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=int, default=60,
+                            help='Keep files younger than this; their row may not be committed yet')
+        parser.add_argument('--recount', action='store_true', help='Rebuild reference counts from the rows first')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recounted = recount_references(StoredBlob, stored_file_fields())
+            self.stdout.write(f'recounted {recounted} referenced files')
+        storage = markdown_storage()
+        cutoff = timezone.now() - timedelta(minutes=options['grace_minutes'])
+        live = set(StoredBlob.objects.filter(ref_count__gt=0).values_list('name', flat=True))
+        # blobs, plus files uploaded before the storage was content-addressed
+        directories = {BLOB_DIR} | {model._meta.get_field(field).upload_to.rstrip('/')
+                                    for model, field in stored_file_fields()}
+        deleted = kept = freed = 0
+        for name in self.walk(storage, sorted(directories)):
+            if name in live or storage.get_modified_time(name) > cutoff:
+                kept += 1
+                continue
+            # counts can drift if rows were changed with queryset.update()
+            if any(model.objects.filter(**{field: name}).exists() for model, field in stored_file_fields()):
+                kept += 1
+                continue
+            size = storage.size(name)
+            if not options['dry_run']:
+                storage.delete(name)
+                StoredBlob.objects.filter(name=name).delete()
+            deleted += 1
+            freed += size
+        verb = 'would delete' if options['dry_run'] else 'deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} files ({freed} bytes), kept {kept}'))
+
+    def walk(self, storage, directories):
+        for directory in directories:
+            if not storage.exists(directory):
+                continue
+            subdirectories, files = storage.listdir(directory)
+            for filename in files:
+                yield f'{directory}/{filename}'
+            yield from self.walk(storage, [f'{directory}/{subdirectory}' for subdirectory in subdirectories])
@@ -0,0 +1,82 @@
+import math
+import random
+from itertools import islice
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from skillup import synthetic
+from skillup.hashing import hash_password
+from skillup.models import MarkdownFile, ModifiedMarkdownFile, SubmittedMarkdownFile, Task, User
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic users, tasks and markdown files for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--tasks', type=int, default=1_000_000)
+        parser.add_argument('--markdown-files', type=int, default=40)
+        parser.add_argument('--min-markdown-bytes', type=int, default=2_000)
+        parser.add_argument('--max-markdown-bytes', type=int, default=2_000_000)
+        parser.add_argument('--prefix', default='load-', help='knox_id prefix of the generated users')
+        parser.add_argument('--password', default='loadtest-password', help='Password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix, batch_size = options['prefix'], options['batch_size']
+        password_hash = hash_password(options['password'])
+
+        admin_id = f'{prefix}admin'
+        admin = User.objects.filter(knox_id=admin_id).first() or User.objects.create_superuser(
+            admin_id, f'{admin_id}@example.com', hashed_password=password_hash
+        )
+
+        # continue numbering after users from an earlier run with the same prefix
+        start = User.objects.filter(knox_id__startswith=prefix).exclude(knox_id=admin_id).count()
+        for chunk in chunked(synthetic.iter_users(rng, options['users'], prefix, password_hash, start), batch_size):
+            User.objects.bulk_create(chunk)
+        self.stdout.write(f"{options['users']} users created")
+
+        submitted_ids = self.create_markdown(rng, admin, options)
+        self.stdout.write(f'{len(submitted_ids)} markdown files created')
+
+        user_ids = list(User.objects.filter(knox_id__startswith=prefix, is_staff=False).values_list('pk', flat=True))
+        now = timezone.now()
+        created = 0
+        for chunk in chunked(synthetic.iter_tasks(rng, options['tasks'], user_ids, submitted_ids, now), batch_size):
+            with transaction.atomic():
+                Task.objects.bulk_create(chunk)
+            created += len(chunk)
+            if created % (batch_size * 20) == 0:
+                self.stdout.write(f'{created} tasks')
+        self.stdout.write(self.style.SUCCESS(
+            f"{created} tasks created; log in as {admin_id} / {options['password']}"
+        ))
+
+    def create_markdown(self, rng, admin, options):
+        # sizes spread evenly on a log scale, so most guides are small and a few are huge
+        low, high = math.log(options['min_markdown_bytes']), math.log(options['max_markdown_bytes'])
+        submitted_ids = []
+        for number in range(options['markdown_files']):
+            text = synthetic.markdown_document(rng, int(math.exp(rng.uniform(low, high))))
+            original = MarkdownFile(title=f'Synthetic lab guide {number + 1}',
+                                    file=ContentFile(text.encode(), name=f'guide-{number + 1}.md'))
+            original.save()
+            modified = ModifiedMarkdownFile(
+                original_file=original, modified_by=admin,
+                modified_file=ContentFile(synthetic.modify_document(rng, text).encode(), name='modified.md'),
+            )
+            modified.save()
+            submitted_ids.append(SubmittedMarkdownFile.objects.create(modified_file=modified).pk)
+        return submitted_ids
@@ -0,0 +1,41 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from skillup.user_import import import_users, read_rows, text_stream
+
+
+class Command(BaseCommand):
+    help = 'Create or update users from a CSV or JSONL export (knox_id, email, department, lab_part, project, password)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--update-passwords', action='store_true',
+                            help='Also replace passwords of users that already exist')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Pass --format csv or --format jsonl')
+
+        def on_error(line_no, message):
+            self.stderr.write(f'line {line_no}: {message}')
+
+        if path == '-':
+            stream = text_stream(sys.stdin.buffer)
+        else:
+            try:
+                stream = text_stream(open(path, 'rb'))
+            except OSError as exc:
+                raise CommandError(exc)
+        with stream:
+            report = import_users(read_rows(stream, fmt), chunk_size=options['chunk_size'],
+                                  update_passwords=options['update_passwords'], on_error=on_error)
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['created']} created, {report['updated']} updated, {report['invalid']} invalid rows"
+        ))
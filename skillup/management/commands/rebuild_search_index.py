@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from skillup import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of markdown titles and content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not search.available():
+            self.stderr.write('Full-text search needs SQLite FTS5; nothing to rebuild')
+            return
+        indexed = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{indexed} documents indexed'))
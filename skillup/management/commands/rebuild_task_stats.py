@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from skillup import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the task statistics tables from skillup_task and report any drift'
+
+    def handle(self, *args, **options):
+        before = stats.summary()
+        stat_rows, bucket_rows = stats.rebuild()
+        after = stats.summary()
+        self.stdout.write(f'{stat_rows} stat rows, {bucket_rows} time buckets rebuilt')
+        if before != after:
+            self.stdout.write(self.style.WARNING('Summary tables had drifted from skillup_task'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Summary tables were consistent'))
@@ -0,0 +1,55 @@
+import markdown  # type: ignore
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'md-html:'
+HITS_KEY = 'md-html-stats:hits'
+MISSES_KEY = 'md-html-stats:misses'
+# markdown rebuilt from a stored delta
+SOURCE_KEY_PREFIX = 'md-source:'
+
+
+def get_cache():
+    return caches[getattr(settings, 'MARKDOWN_CACHE_ALIAS', 'default')]
+
+
+def _incr(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def render_task_markdown(task):
+    submitted = task.submitted_file
+    modified = submitted.modified_file if submitted else None
+    if modified is None or not modified.has_content():
+        return markdown.markdown('')
+
+    cache = get_cache()
+    key = KEY_PREFIX + modified.get_content_hash()
+    html = cache.get(key)
+    if html is not None:
+        _incr(HITS_KEY)
+        return html
+    _incr(MISSES_KEY)
+    html = markdown.markdown(task.get_markdown_content())
+    cache.set(key, html)
+    return html
+
+
+def invalidate(content_hash):
+    if content_hash:
+        get_cache().delete_many([KEY_PREFIX + content_hash, SOURCE_KEY_PREFIX + content_hash])
+
+
+def stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': values.get(HITS_KEY, 0),
+        'misses': values.get(MISSES_KEY, 0),
+    }
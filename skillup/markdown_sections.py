@@ -0,0 +1,87 @@
+"""Split a markdown file at its headings and render it one section at a time.
+
+The section index (byte offset, length and title of each section) is built in
+one streaming pass over the file and cached by content hash, so a request for
+section N seeks straight to it. Delta-stored files are rebuilt line by line
+on the fly and only the requested section is kept. Memory use is bounded by
+the largest section, not the document.
+"""
+import re
+
+import markdown  # type: ignore
+
+from .markdown_cache import KEY_PREFIX, get_cache
+
+INDEX_KEY_PREFIX = 'md-sections:'
+HEADING = re.compile(rb'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?[ \t#]*$')
+FENCE = re.compile(rb'^ {0,3}(`{3,}|~{3,})')
+
+
+def build_index(lines):
+    """Return [(offset, length, title), ...], one entry per section of an iterable of byte lines.
+
+    A section starts at an ATX heading outside a fenced code block; anything
+    before the first heading is section 0 with an empty title.
+    """
+    sections = []
+    start, title, offset, fence = 0, '', 0, None
+    for line in lines:
+        stripped = line.rstrip(b'\r\n')
+        fence_match = FENCE.match(stripped)
+        if fence_match:
+            marker = fence_match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[:1] == fence[:1] and len(marker) >= len(fence):
+                fence = None
+        elif fence is None:
+            heading = HEADING.match(stripped)
+            if heading and offset > start:
+                sections.append((start, offset - start, title))
+            if heading:
+                start, title = offset, (heading.group(2) or b'').decode('utf-8', 'replace')
+        offset += len(line)
+    if offset > start or not sections:
+        sections.append((start, offset - start, title))
+    return sections
+
+
+def get_index(markdown_file):
+    """Cached section index for a ModifiedMarkdownFile."""
+    cache = get_cache()
+    key = INDEX_KEY_PREFIX + markdown_file.get_content_hash()
+    index = cache.get(key)
+    if index is None:
+        index = build_index(markdown_file.iter_content_lines())
+        cache.set(key, index)
+    return index
+
+
+def render_section(markdown_file, index, number):
+    # reference-style links only resolve within their own section
+    cache = get_cache()
+    key = f'{KEY_PREFIX}{markdown_file.get_content_hash()}:{number}'
+    html = cache.get(key)
+    if html is None:
+        offset, length, _ = index[number]
+        html = markdown.markdown(markdown_file.read_range(offset, length).decode('utf-8'))
+        cache.set(key, html)
+    return html
+
+
+def iter_rendered(markdown_file):
+    index = get_index(markdown_file)
+    for number in range(len(index)):
+        yield f'<section id="section-{number}" data-section="{number}">\n'
+        yield render_section(markdown_file, index, number)
+        yield '\n</section>\n'
+
+
+def invalidate(content_hash):
+    if not content_hash:
+        return
+    cache = get_cache()
+    index = cache.get(INDEX_KEY_PREFIX + content_hash) or []
+    cache.delete_many([INDEX_KEY_PREFIX + content_hash] + [
+        f'{KEY_PREFIX}{content_hash}:{number}' for number in range(len(index))
+    ])
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillup', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modifiedmarkdownfile',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='SHA-256 of modified_file, keys the rendered markdown cache', max_length=64),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0003_task_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="markdownfile",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="SHA-256 of the file content",
+                max_length=64,
+            ),
+        ),
+        migrations.AddField(
+            model_name="markdownfile",
+            name="line_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="markdownfile",
+            name="preview",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="markdownfile",
+            name="size",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, help_text="Size in bytes"
+            ),
+        ),
+        migrations.AddField(
+            model_name="modifiedmarkdownfile",
+            name="line_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="modifiedmarkdownfile",
+            name="preview",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="modifiedmarkdownfile",
+            name="size",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, help_text="Size in bytes"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="modifiedmarkdownfile",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                help_text="SHA-256 of the file content",
+                max_length=64,
+            ),
+        ),
+    ]
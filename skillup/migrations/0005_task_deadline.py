@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:14
+
+from django.db import migrations, models
+
+from skillup.expressions import deadline_from
+
+
+def backfill_deadlines(apps, schema_editor):
+    Task = apps.get_model("skillup", "Task")
+    Task.objects.filter(
+        status="ongoing", deadline__isnull=True, started_at__isnull=False
+    ).update(deadline=deadline_from(models.F("started_at")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0004_file_summaries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="deadline",
+            field=models.DateTimeField(
+                blank=True, help_text="started_at + time limit, set on start", null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "deadline"], name="task_status_deadline_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,218 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+# The trigger and rebuild SQL is spelled out here rather than imported from
+# skillup.stats, so later changes there can't alter this migration. Buckets
+# are TaskTimeBucket.TIME_BUCKET_SECONDS (60) wide.
+TRIGGERS = {
+    "skillup_taskstat_insert": """
+CREATE TRIGGER skillup_taskstat_insert AFTER INSERT ON skillup_task
+BEGIN
+    INSERT INTO skillup_taskstat
+        (department, lab_part, status, review_status, task_count, timed_count, time_taken_sum)
+    SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), NEW.status, NEW.review_status,
+           1, NEW.time_taken IS NOT NULL, COALESCE(NEW.time_taken, 0)
+    FROM skillup_user u WHERE u.id = NEW.assigned_to_id
+    ON CONFLICT (department, lab_part, status, review_status) DO UPDATE SET
+        task_count = task_count + 1,
+        timed_count = timed_count + excluded.timed_count,
+        time_taken_sum = time_taken_sum + excluded.time_taken_sum;
+    INSERT INTO skillup_tasktimebucket (department, lab_part, bucket, task_count)
+    SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), NEW.time_taken / 60, 1
+    FROM skillup_user u WHERE u.id = NEW.assigned_to_id AND NEW.time_taken IS NOT NULL
+    ON CONFLICT (department, lab_part, bucket) DO UPDATE SET task_count = task_count + 1;
+END
+""",
+    "skillup_taskstat_delete": """
+CREATE TRIGGER skillup_taskstat_delete AFTER DELETE ON skillup_task
+BEGIN
+    UPDATE skillup_taskstat SET
+        task_count = task_count - 1,
+        timed_count = timed_count - (OLD.time_taken IS NOT NULL),
+        time_taken_sum = time_taken_sum - COALESCE(OLD.time_taken, 0)
+    WHERE status = OLD.status AND review_status = OLD.review_status
+      AND (department, lab_part) = (
+          SELECT COALESCE(department, ''), COALESCE(lab_part, '') FROM skillup_user WHERE id = OLD.assigned_to_id
+      );
+    UPDATE skillup_tasktimebucket SET task_count = task_count - 1
+    WHERE OLD.time_taken IS NOT NULL AND bucket = OLD.time_taken / 60
+      AND (department, lab_part) = (
+          SELECT COALESCE(department, ''), COALESCE(lab_part, '') FROM skillup_user WHERE id = OLD.assigned_to_id
+      );
+END
+""",
+    "skillup_taskstat_update": """
+CREATE TRIGGER skillup_taskstat_update AFTER UPDATE OF status, review_status, time_taken, assigned_to_id ON skillup_task
+BEGIN
+    UPDATE skillup_taskstat SET
+        task_count = task_count - 1,
+        timed_count = timed_count - (OLD.time_taken IS NOT NULL),
+        time_taken_sum = time_taken_sum - COALESCE(OLD.time_taken, 0)
+    WHERE status = OLD.status AND review_status = OLD.review_status
+      AND (department, lab_part) = (
+          SELECT COALESCE(department, ''), COALESCE(lab_part, '') FROM skillup_user WHERE id = OLD.assigned_to_id
+      );
+    UPDATE skillup_tasktimebucket SET task_count = task_count - 1
+    WHERE OLD.time_taken IS NOT NULL AND bucket = OLD.time_taken / 60
+      AND (department, lab_part) = (
+          SELECT COALESCE(department, ''), COALESCE(lab_part, '') FROM skillup_user WHERE id = OLD.assigned_to_id
+      );
+
+    INSERT INTO skillup_taskstat
+        (department, lab_part, status, review_status, task_count, timed_count, time_taken_sum)
+    SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), NEW.status, NEW.review_status,
+           1, NEW.time_taken IS NOT NULL, COALESCE(NEW.time_taken, 0)
+    FROM skillup_user u WHERE u.id = NEW.assigned_to_id
+    ON CONFLICT (department, lab_part, status, review_status) DO UPDATE SET
+        task_count = task_count + 1,
+        timed_count = timed_count + excluded.timed_count,
+        time_taken_sum = time_taken_sum + excluded.time_taken_sum;
+    INSERT INTO skillup_tasktimebucket (department, lab_part, bucket, task_count)
+    SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), NEW.time_taken / 60, 1
+    FROM skillup_user u WHERE u.id = NEW.assigned_to_id AND NEW.time_taken IS NOT NULL
+    ON CONFLICT (department, lab_part, bucket) DO UPDATE SET task_count = task_count + 1;
+END
+""",
+}
+
+# recompute both summary tables from skillup_task
+REBUILD = [
+    "DELETE FROM skillup_taskstat",
+    "DELETE FROM skillup_tasktimebucket",
+    """
+INSERT INTO skillup_taskstat
+    (department, lab_part, status, review_status, task_count, timed_count, time_taken_sum)
+SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.status, t.review_status,
+       COUNT(*), COUNT(t.time_taken), COALESCE(SUM(t.time_taken), 0)
+FROM skillup_task t JOIN skillup_user u ON u.id = t.assigned_to_id
+GROUP BY COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.status, t.review_status
+""",
+    """
+INSERT INTO skillup_tasktimebucket (department, lab_part, bucket, task_count)
+SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.time_taken / 60, COUNT(*)
+FROM skillup_task t JOIN skillup_user u ON u.id = t.assigned_to_id
+WHERE t.time_taken IS NOT NULL
+GROUP BY COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.time_taken / 60
+""",
+]
+
+
+def install_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for name, sql in TRIGGERS.items():
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        schema_editor.execute(sql)
+
+
+def remove_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for name in TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def populate(apps, schema_editor):
+    for sql in REBUILD:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0005_task_deadline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("department", models.CharField(blank=True, default="", max_length=10)),
+                ("lab_part", models.CharField(blank=True, default="", max_length=10)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("assigned", "Assigned"),
+                            ("ongoing", "Ongoing"),
+                            ("submitted", "Submitted"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "review_status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("passed", "Passed"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("task_count", models.BigIntegerField(default=0)),
+                (
+                    "timed_count",
+                    models.BigIntegerField(
+                        default=0, help_text="Tasks with a time_taken"
+                    ),
+                ),
+                ("time_taken_sum", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("department", "lab_part", "status", "review_status"),
+                        name="taskstat_unique_key",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="TaskTimeBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("department", models.CharField(blank=True, default="", max_length=10)),
+                ("lab_part", models.CharField(blank=True, default="", max_length=10)),
+                (
+                    "bucket",
+                    models.PositiveIntegerField(
+                        help_text="time_taken // TIME_BUCKET_SECONDS"
+                    ),
+                ),
+                ("task_count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("department", "lab_part", "bucket"),
+                        name="tasktimebucket_unique_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(install_triggers, remove_triggers),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0006_task_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="modifiedmarkdownfile",
+            name="delta",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:34
+
+import skillup.storage
+from django.db import migrations, models
+
+
+def count_references(apps, schema_editor):
+    MarkdownFile = apps.get_model("skillup", "MarkdownFile")
+    ModifiedMarkdownFile = apps.get_model("skillup", "ModifiedMarkdownFile")
+    skillup.storage.recount_references(
+        apps.get_model("skillup", "StoredBlob"),
+        [(MarkdownFile, "file"), (ModifiedMarkdownFile, "modified_file")],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0007_modifiedmarkdownfile_delta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="markdownfile",
+            name="file",
+            field=models.FileField(
+                storage=skillup.storage.markdown_storage, upload_to="admin_md_files/"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="modifiedmarkdownfile",
+            name="modified_file",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=skillup.storage.markdown_storage,
+                upload_to="modified_md_files/",
+            ),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
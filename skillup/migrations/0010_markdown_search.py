@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:37
+
+from django.db import migrations
+
+
+def create_table(apps, schema_editor):
+    from skillup import search
+
+    search.create_table(schema_editor)
+
+
+def drop_table(apps, schema_editor):
+    from skillup import search
+
+    search.drop_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0009_task_updated_indexes"),
+    ]
+
+    # the index is filled by the rebuild_search_index command, which reads every file
+    operations = [
+        migrations.RunPython(create_table, drop_table),
+    ]
@@ -0,0 +1,92 @@
+from django.db import migrations
+
+# a user's department or lab_part changed: move all their tasks from the old
+# group to the new one. Spelled out rather than imported from skillup.stats,
+# see 0006_task_stats
+TRIGGER = """
+CREATE TRIGGER skillup_taskstat_user_group AFTER UPDATE OF department, lab_part ON skillup_user
+WHEN COALESCE(OLD.department, '') != COALESCE(NEW.department, '')
+  OR COALESCE(OLD.lab_part, '') != COALESCE(NEW.lab_part, '')
+BEGIN
+    UPDATE skillup_taskstat SET
+        task_count = task_count - (
+            SELECT COUNT(*) FROM skillup_task t WHERE t.assigned_to_id = NEW.id
+              AND t.status = skillup_taskstat.status AND t.review_status = skillup_taskstat.review_status
+        ),
+        timed_count = timed_count - (
+            SELECT COUNT(t.time_taken) FROM skillup_task t WHERE t.assigned_to_id = NEW.id
+              AND t.status = skillup_taskstat.status AND t.review_status = skillup_taskstat.review_status
+        ),
+        time_taken_sum = time_taken_sum - (
+            SELECT COALESCE(SUM(t.time_taken), 0) FROM skillup_task t WHERE t.assigned_to_id = NEW.id
+              AND t.status = skillup_taskstat.status AND t.review_status = skillup_taskstat.review_status
+        )
+    WHERE department = COALESCE(OLD.department, '') AND lab_part = COALESCE(OLD.lab_part, '');
+    INSERT INTO skillup_taskstat
+        (department, lab_part, status, review_status, task_count, timed_count, time_taken_sum)
+    SELECT COALESCE(NEW.department, ''), COALESCE(NEW.lab_part, ''), t.status, t.review_status,
+           COUNT(*), COUNT(t.time_taken), COALESCE(SUM(t.time_taken), 0)
+    FROM skillup_task t WHERE t.assigned_to_id = NEW.id GROUP BY t.status, t.review_status
+    ON CONFLICT (department, lab_part, status, review_status) DO UPDATE SET
+        task_count = task_count + excluded.task_count,
+        timed_count = timed_count + excluded.timed_count,
+        time_taken_sum = time_taken_sum + excluded.time_taken_sum;
+    UPDATE skillup_tasktimebucket SET task_count = task_count - (
+        SELECT COUNT(*) FROM skillup_task t WHERE t.assigned_to_id = NEW.id
+          AND t.time_taken IS NOT NULL AND t.time_taken / 60 = skillup_tasktimebucket.bucket
+    )
+    WHERE department = COALESCE(OLD.department, '') AND lab_part = COALESCE(OLD.lab_part, '');
+    INSERT INTO skillup_tasktimebucket (department, lab_part, bucket, task_count)
+    SELECT COALESCE(NEW.department, ''), COALESCE(NEW.lab_part, ''), t.time_taken / 60, COUNT(*)
+    FROM skillup_task t WHERE t.assigned_to_id = NEW.id AND t.time_taken IS NOT NULL
+    GROUP BY t.time_taken / 60
+    ON CONFLICT (department, lab_part, bucket) DO UPDATE SET task_count = task_count + excluded.task_count;
+END
+"""
+
+# recompute both summary tables from skillup_task
+REBUILD = [
+    "DELETE FROM skillup_taskstat",
+    "DELETE FROM skillup_tasktimebucket",
+    """
+INSERT INTO skillup_taskstat
+    (department, lab_part, status, review_status, task_count, timed_count, time_taken_sum)
+SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.status, t.review_status,
+       COUNT(*), COUNT(t.time_taken), COALESCE(SUM(t.time_taken), 0)
+FROM skillup_task t JOIN skillup_user u ON u.id = t.assigned_to_id
+GROUP BY COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.status, t.review_status
+""",
+    """
+INSERT INTO skillup_tasktimebucket (department, lab_part, bucket, task_count)
+SELECT COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.time_taken / 60, COUNT(*)
+FROM skillup_task t JOIN skillup_user u ON u.id = t.assigned_to_id
+WHERE t.time_taken IS NOT NULL
+GROUP BY COALESCE(u.department, ''), COALESCE(u.lab_part, ''), t.time_taken / 60
+""",
+]
+
+
+def install_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TRIGGER IF EXISTS skillup_taskstat_user_group")
+    schema_editor.execute(TRIGGER)
+    # groups left behind by department/lab_part changes made before the trigger
+    for sql in REBUILD:
+        schema_editor.execute(sql)
+
+
+def remove_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TRIGGER IF EXISTS skillup_taskstat_user_group")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("skillup", "0010_markdown_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_trigger, remove_trigger),
+    ]
@@ -1,11 +1,34 @@
 import os
-from django.db import models
+from contextlib import closing
+
+from django.core.files.base import ContentFile
+from django.db import models, router
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
+from . import deltas, file_summary, markdown_cache, markdown_sections
+from .storage import add_reference, markdown_storage, remove_reference
+
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # no post_save for bulk updates: drop the cached users they touch
+        # (e.g. a bulk is_active=False), read from the primary before the
+        # filter stops matching
+        from .backends import bump_users_version, forget_users
+        db = self._db or router.db_for_write(self.model, **self._hints)
+        user_ids = list(self.using(db).values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        if user_ids:
+            forget_users(user_ids)
+            bump_users_version()
+        return rows
+
+    update.alters_data = True
 
-class UserManager(BaseUserManager):
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(self, knox_id, email=None, password=None, department=None, lab_part=None, project=None,
-                    **extra_fields):
+                    hashed_password=None, **extra_fields):
         if not knox_id:
             raise ValueError('Knox ID must be set')
         email = self.normalize_email(email) if email else None
@@ -19,7 +42,10 @@ class UserManager(BaseUserManager):
             project=project,
             **extra_fields
         )
-        user.set_password(password)
+        if hashed_password:
+            user.password = hashed_password
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
@@ -61,24 +87,215 @@ class User(AbstractUser):
         return f'{self.knox_id} - {self.email}'
 
 
-class MarkdownFile(models.Model):
+class SummarizedFileModel(models.Model):
+    # computed from the file whenever a new one is saved, so list pages never open it
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False,
+                                    help_text='SHA-256 of the file content')
+    preview = models.TextField(blank=True, default='', editable=False)
+    size = models.PositiveBigIntegerField(default=0, editable=False, help_text='Size in bytes')
+    line_count = models.PositiveIntegerField(default=0, editable=False)
+
+    summarized_field = None
+
+    class Meta:
+        abstract = True
+
+    def _apply_summary(self, summary):
+        self.content_hash, self.size, self.line_count, self.preview = summary
+
+    def has_content(self):
+        return bool(getattr(self, self.summarized_field))
+
+    def save(self, *args, **kwargs):
+        field_file = getattr(self, self.summarized_field)
+        if not self.has_content():
+            self._apply_summary(file_summary.EMPTY_SUMMARY)
+        elif field_file and not field_file._committed:
+            self._apply_summary(file_summary.summarize(field_file))
+            # lets the content-addressed storage skip hashing the upload again
+            field_file.file.content_hash = self.content_hash
+        super().save(*args, **kwargs)
+
+    def _summary_source(self):
+        return getattr(self, self.summarized_field)
+
+    def refresh_summary(self):
+        self._apply_summary(
+            file_summary.summarize(self._summary_source()) if self.has_content() else file_summary.EMPTY_SUMMARY
+        )
+        type(self).objects.filter(pk=self.pk).update(
+            content_hash=self.content_hash, size=self.size, line_count=self.line_count, preview=self.preview
+        )
+
+
+class MarkdownFile(SummarizedFileModel):
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='admin_md_files/')
+    file = models.FileField(upload_to='admin_md_files/', storage=markdown_storage)
     upload_at = models.DateTimeField(auto_now_add=True)
 
+    summarized_field = 'file'
+
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.pk and self.file and not self.file._committed:
+            # deltas only apply to the content they were taken against
+            previous = MarkdownFile.objects.filter(pk=self.pk).first()
+            if previous is not None:
+                for modification in previous.modifications.exclude(delta=''):
+                    modification.original_file = previous
+                    modification.store_in_full()
+        super().save(*args, **kwargs)
+
 
-class ModifiedMarkdownFile(models.Model):
+class ModifiedMarkdownFile(SummarizedFileModel):
     original_file = models.ForeignKey(MarkdownFile, on_delete=models.CASCADE, related_name='modifications')
-    modified_file = models.FileField(upload_to='modified_md_files/', blank=True, null=True)
+    modified_file = models.FileField(upload_to='modified_md_files/', storage=markdown_storage, blank=True, null=True)
+    # line delta against original_file (see deltas.py); modified_file is empty when this is set
+    delta = models.TextField(blank=True, default='', editable=False)
     modified_by = models.ForeignKey(User, on_delete=models.CASCADE)
     modified_at = models.DateTimeField(auto_now=True)
 
+    summarized_field = 'modified_file'
+
     def __str__(self):
         return f'Modified: {self.original_file} by {self.modified_by.knox_id}'
 
+    def has_content(self):
+        return bool(self.delta) or super().has_content()
+
+    def _summary_source(self):
+        return self.open_content() if self.delta else self.modified_file
+
+    def save(self, *args, **kwargs):
+        previous_hash = self.content_hash
+        # original_file the delta was taken against, remembered on load (see signals)
+        based_on = getattr(self, '_delta_base', None)
+        if self.delta and based_on not in (None, self.original_file_id) and not (
+            self.modified_file and not self.modified_file._committed
+        ):
+            # the ops only replay against their own original: rebuild the
+            # content from it and diff that against the new original below
+            base = MarkdownFile.objects.get(pk=based_on)
+            self.modified_file = ContentFile(
+                b''.join(deltas.iter_lines(base.file, deltas.decode(self.delta))),
+                name=os.path.basename(base.file.name),
+            )
+        upload = self.modified_file
+        if upload and not upload._committed:
+            self.delta = ''
+            if self.original_file_id and self.original_file.file:
+                ops = deltas.compute_ops(self.original_file.file, upload)
+                delta = deltas.encode(ops)
+                if len(delta) < upload.size:
+                    self._apply_summary(file_summary.summarize(upload))
+                    self.delta, self.modified_file = delta, None
+        super().save(*args, **kwargs)
+        self._delta_base = self.original_file_id
+        if previous_hash != self.content_hash:
+            markdown_cache.invalidate(previous_hash)
+            markdown_sections.invalidate(previous_hash)
+
+    def read_content(self):
+        if not self.delta:
+            with self.modified_file.open('rb') as f:
+                return f.read()
+        # rebuilt from the original once, then served from the cache
+        cache = markdown_cache.get_cache()
+        key = markdown_cache.SOURCE_KEY_PREFIX + self.content_hash
+        content = cache.get(key)
+        if content is None:
+            content = b''.join(deltas.iter_lines(self.original_file.file, deltas.decode(self.delta)))
+            cache.set(key, content)
+        return content
+
+    def iter_content_lines(self):
+        """The content line by line, streamed from the stored copy or rebuilt from the delta."""
+        if self.delta:
+            yield from deltas.iter_lines(self.original_file.file, deltas.decode(self.delta))
+            return
+        with self.modified_file.open('rb') as f:
+            yield from f
+
+    def read_range(self, offset, length):
+        """length bytes from offset, which must both fall on line boundaries."""
+        if not self.delta:
+            with self.modified_file.open('rb') as f:
+                f.seek(offset)
+                return f.read(length)
+        # only the requested lines are kept; the rest stream past
+        parts, position = [], 0
+        with closing(self.iter_content_lines()) as lines:
+            for line in lines:
+                if position >= offset + length:
+                    break
+                if position >= offset:
+                    parts.append(line)
+                position += len(line)
+        return b''.join(parts)
+
+    def open_content(self):
+        if not self.delta:
+            return self.modified_file.open('rb')
+        return ContentFile(self.read_content(), name=self.original_file.file.name)
+
+    def get_ops(self):
+        if self.delta:
+            return deltas.decode(self.delta)
+        return deltas.compute_ops(self.original_file.file, self.modified_file)
+
+    def store_as_delta(self):
+        """Replace the stored copy with a delta if that is smaller.
+
+        Returns the bytes saved, or None when the delta would not be smaller.
+        """
+        if self.delta or not self.modified_file:
+            return None
+        delta = deltas.encode(deltas.compute_ops(self.original_file.file, self.modified_file))
+        size = self.modified_file.size
+        if len(delta) >= size:
+            return None
+        rebuilt = file_summary.summarize(ContentFile(
+            b''.join(deltas.iter_lines(self.original_file.file, deltas.decode(delta)))
+        ))
+        if rebuilt.content_hash != self.get_content_hash():
+            return None
+        stored_name = self.modified_file.name
+        type(self).objects.filter(pk=self.pk).update(delta=delta, modified_file='')
+        self.delta, self.modified_file = delta, None
+        # the file itself goes when gc_blobs finds nothing else using it
+        remove_reference(stored_name)
+        self._stored_name = ''
+        return size - len(delta)
+
+    def store_in_full(self):
+        if not self.delta:
+            return
+        content = ContentFile(b''.join(deltas.iter_lines(self.original_file.file, deltas.decode(self.delta))))
+        self.modified_file.save(os.path.basename(self.original_file.file.name), content, save=False)
+        self.delta = ''
+        type(self).objects.filter(pk=self.pk).update(delta='', modified_file=self.modified_file.name)
+        add_reference(self.modified_file.name)
+        self._stored_name = self.modified_file.name
+
+    def get_content_hash(self):
+        # rows saved before content_hash existed get it filled in lazily
+        if not self.content_hash and self.has_content():
+            self.refresh_summary()
+        return self.content_hash
+
+
+class StoredBlob(models.Model):
+    # how many markdown rows point at a stored file (see storage.py); kept
+    # current by signals, recounted and garbage-collected by gc_blobs
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count})'
+
 
 class SubmittedMarkdownFile(models.Model):
     modified_file = models.OneToOneField(ModifiedMarkdownFile, on_delete=models.CASCADE)
@@ -131,29 +348,93 @@ class Task(models.Model):
 
     # tracking
     started_at = models.DateTimeField(blank=True, null=True)
+    deadline = models.DateTimeField(blank=True, null=True, help_text='started_at + time limit, set on start')
     time_taken = models.PositiveIntegerField(blank=True, null=True, help_text="Seconds taken to submit")
 
+    class Meta:
+        indexes = [
+            # student dashboard: own tasks by status, and the keyset-paginated list
+            models.Index(fields=['assigned_to', 'status'], name='task_assignee_status_idx'),
+            models.Index(fields=['assigned_to', 'created_at', 'id'], name='task_assignee_created_idx'),
+            # list ETags: row count and newest updated_at of the visible tasks
+            models.Index(fields=['assigned_to', 'updated_at'], name='task_assignee_updated_idx'),
+            models.Index(fields=['updated_at'], name='task_updated_idx'),
+            # admin list filters
+            models.Index(fields=['status', 'review_status'], name='task_status_review_idx'),
+            models.Index(fields=['review_status'], name='task_review_status_idx'),
+            # staff keyset pagination
+            models.Index(fields=['created_at', 'id'], name='task_created_idx'),
+            # deadline sweeper: expired ongoing tasks
+            models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+            # review queue: done tasks nobody has reviewed yet
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(status='done', review_status='pending'),
+                name='task_review_queue_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.title or 'Untitled Task'
 
-    def get_markdown_content(self):
+    def get_markdown_file(self):
         if self.submitted_file and self.submitted_file.modified_file:
-            final_md = self.submitted_file.modified_file.modified_file
-            if final_md:
-                with final_md.open('rb') as f:
-                    content = f.read()
-                return content.decode('utf-8') if isinstance(content, bytes) else content
+            return self.submitted_file.modified_file
+        return None
+
+    def get_markdown_content(self):
+        markdown_file = self.get_markdown_file()
+        if markdown_file and markdown_file.has_content():
+            content = markdown_file.read_content()
+            return content.decode('utf-8') if isinstance(content, bytes) else content
         return ""
 
+    def _apply_transition(self, action):
+        from .transitions import transition, InvalidTransition
+        try:
+            state = transition(self.pk, action)
+        except InvalidTransition:
+            return False
+        for field, value in state.items():
+            setattr(self, field, value)
+        return True
+
     def start_task(self):
-        from django.utils import timezone
-        if self.status in ('assigned', 'submitted'):
-            self.status = 'ongoing'
-            if not self.started_at:
-                self.started_at = timezone.now()
-            self.save()
+        started_at = self.started_at
+        if self._apply_transition('start') and not started_at:
+            self.started_at = self.updated_at
 
     def complete_task(self):
-        if self.status in ('ongoing', 'submitted'):
-            self.status = 'done'
-            self.save()
+        self._apply_transition('complete')
+
+
+class TaskStat(models.Model):
+    # kept current by database triggers on skillup_task (see migration 0006),
+    # rebuilt from scratch by the rebuild_task_stats command
+    department = models.CharField(max_length=10, blank=True, default='')
+    lab_part = models.CharField(max_length=10, blank=True, default='')
+    status = models.CharField(max_length=10, choices=Task.STATUS_CHOICE)
+    review_status = models.CharField(max_length=10, choices=Task.REVIEW_STATUS_CHOICE)
+    task_count = models.BigIntegerField(default=0)
+    timed_count = models.BigIntegerField(default=0, help_text='Tasks with a time_taken')
+    time_taken_sum = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['department', 'lab_part', 'status', 'review_status'],
+                                    name='taskstat_unique_key'),
+        ]
+
+
+class TaskTimeBucket(models.Model):
+    TIME_BUCKET_SECONDS = 60
+
+    department = models.CharField(max_length=10, blank=True, default='')
+    lab_part = models.CharField(max_length=10, blank=True, default='')
+    bucket = models.PositiveIntegerField(help_text='time_taken // TIME_BUCKET_SECONDS')
+    task_count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['department', 'lab_part', 'bucket'], name='tasktimebucket_unique_key'),
+        ]
@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Task
+
+REVIEW_RESULTS = ('passed', 'failed')
+
+
+def review_tasks(task_ids, review_status):
+    """Set review_status on every done task in task_ids with a single UPDATE.
+
+    Returns a per-id result: 'updated', 'not_done' or 'not_found'.
+    """
+    if review_status not in REVIEW_RESULTS:
+        raise ValueError(f'review_status must be one of {REVIEW_RESULTS}')
+    task_ids = set(task_ids)
+    with transaction.atomic():
+        current = dict(Task.objects.filter(id__in=task_ids).values_list('id', 'status'))
+        done_ids = [task_id for task_id, task_status in current.items() if task_status == 'done']
+        if done_ids:
+            Task.objects.filter(id__in=done_ids, status='done').update(
+                review_status=review_status, updated_at=timezone.now()
+            )
+    results = {}
+    for task_id in sorted(task_ids):
+        if task_id not in current:
+            results[task_id] = 'not_found'
+        elif current[task_id] != 'done':
+            results[task_id] = 'not_done'
+        else:
+            results[task_id] = 'updated'
+    return results
@@ -0,0 +1,164 @@
+"""Full-text search over markdown titles and content, backed by SQLite FTS5.
+
+One FTS row per MarkdownFile and ModifiedMarkdownFile, addressed by rowid
+(pk * 2 for originals, pk * 2 + 1 for modifications) so a document is
+replaced or removed without scanning the index. Rows are refreshed by
+signals when a file's content or title changes; rebuild_search_index
+recreates the lot. On other databases indexing is skipped and search falls
+back to title matching.
+"""
+import html
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import MarkdownFile, ModifiedMarkdownFile
+
+TABLE = 'skillup_markdown_fts'
+KINDS = {MarkdownFile: 0, ModifiedMarkdownFile: 1}
+# bm25 column weights: title, author, body
+WEIGHTS = (10.0, 5.0, 1.0)
+# placeholders that cannot occur in markdown; swapped for <mark> after escaping
+_START, _END = '\x02', '\x03'
+
+
+def available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def create_table(schema_editor):
+    if available(schema_editor.connection):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+            f"title, author, body, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+
+
+def drop_table(schema_editor):
+    if available(schema_editor.connection):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+def _rowid(obj):
+    return obj.pk * 2 + KINDS[type(obj)]
+
+
+def _document(obj):
+    if isinstance(obj, ModifiedMarkdownFile):
+        title, author = obj.original_file.title, obj.modified_by.knox_id
+        content = obj.read_content() if obj.has_content() else b''
+    else:
+        title, author = obj.title, ''
+        with obj.file.open('rb') as f:
+            content = f.read()
+    return title, author, content.decode('utf-8', 'replace')
+
+
+def index(obj):
+    if not available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [_rowid(obj)])
+        cursor.execute(f'INSERT INTO {TABLE} (rowid, title, author, body) VALUES (%s, %s, %s, %s)',
+                       [_rowid(obj), *_document(obj)])
+
+
+def unindex(model, pk):
+    # takes the pk rather than the instance, which has none once deleted
+    if available():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [pk * 2 + KINDS[model]])
+
+
+def retitle(markdown_file):
+    """Carry an original's new title to its modifications without re-reading their content."""
+    if not available():
+        return
+    rowids = [pk * 2 + 1 for pk in markdown_file.modifications.values_list('pk', flat=True)]
+    if rowids:
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {TABLE} SET title = %s WHERE rowid IN ({", ".join(["%s"] * len(rowids))})',
+                           [markdown_file.title, *rowids])
+
+
+def rebuild(batch_size=200):
+    if not available():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    indexed = 0
+    for model in KINDS:
+        queryset = model.objects.order_by('pk')
+        if model is ModifiedMarkdownFile:
+            queryset = queryset.select_related('original_file', 'modified_by')
+        for obj in queryset.iterator(chunk_size=batch_size):
+            try:
+                index(obj)
+            except FileNotFoundError:
+                continue
+            indexed += 1
+    return indexed
+
+
+def to_match_query(text):
+    """Quote every word so user input is never parsed as FTS5 syntax; the last one matches as a prefix."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _highlight(snippet):
+    return html.escape(snippet).replace(_START, '<mark>').replace(_END, '</mark>')
+
+
+def _title_search(text, kind, limit):
+    rows = []
+    if kind in (None, KINDS[MarkdownFile]):
+        rows += [(KINDS[MarkdownFile], pk, title, '') for pk, title in
+                 MarkdownFile.objects.filter(title__icontains=text).values_list('pk', 'title')[:limit]]
+    if kind in (None, KINDS[ModifiedMarkdownFile]):
+        rows += [(KINDS[ModifiedMarkdownFile], *row) for row in
+                 ModifiedMarkdownFile.objects.filter(original_file__title__icontains=text)
+                 .values_list('pk', 'original_file__title', 'modified_by__knox_id')[:limit]]
+    return [{'kind': kind, 'id': pk, 'title': title, 'author': author, 'snippet': '', 'rank': 0.0}
+            for kind, pk, title, author in rows[:limit]]
+
+
+def search(text, kind=None, limit=20):
+    """Ranked matches as dicts: kind, id, title, author, snippet (HTML), rank (lower is better)."""
+    match = to_match_query(text)
+    if not match:
+        return []
+    if not available():
+        return _title_search(text, kind, limit)
+    sql = (f"SELECT rowid, title, author, snippet({TABLE}, 2, %s, %s, '…', 16), bm25({TABLE}, %s, %s, %s) AS rank "
+           f"FROM {TABLE} WHERE {TABLE} MATCH %s")
+    params = [_START, _END, *WEIGHTS, match]
+    if kind is not None:
+        sql += ' AND rowid %% 2 = %s'
+        params.append(kind)
+    sql += ' ORDER BY rank LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {'kind': rowid % 2, 'id': rowid // 2, 'title': title, 'author': author,
+         'snippet': _highlight(snippet), 'rank': rank}
+        for rowid, title, author, snippet, rank in rows
+    ]
+
+
+def filter_matching(queryset, text):
+    """queryset narrowed to its rows that match text, however many there are."""
+    model = queryset.model
+    match = to_match_query(text)
+    if not match:
+        return queryset.none()
+    if not available():
+        title = 'title' if model is MarkdownFile else 'original_file__title'
+        return queryset.filter(**{f'{title}__icontains': text})
+    return queryset.filter(pk__in=RawSQL(
+        f'SELECT rowid / 2 FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid %% 2 = %s', [match, KINDS[model]]
+    ))
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from .hashing import hash_password
 from .models import Task, MarkdownFile, ModifiedMarkdownFile, SubmittedMarkdownFile
 
 User = get_user_model()
@@ -16,7 +17,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ("id", "username", "email", "first_name", "last_name", "password")
+        fields = ("id", "knox_id", "email", "first_name", "last_name", "password")
         extra_kwargs = {'email': {'required': False, 'allow_null': True, 'allow_blank': True}}
 
     def validate_email(self, value):
@@ -26,10 +27,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         password = validated_data.pop("password")
-        user = User.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        return User.objects.create_user(hashed_password=hash_password(password), **validated_data)
 
 
 class MarkdownFileSerializer(serializers.ModelSerializer):
@@ -41,7 +39,7 @@ class MarkdownFileSerializer(serializers.ModelSerializer):
 class ModifiedMarkdownFileSerializer(serializers.ModelSerializer):
     class Meta:
         model = ModifiedMarkdownFile
-        fields = "__all__"
+        exclude = ["delta"]
 
 
 class SubmittedMarkdownFileSerializer(serializers.ModelSerializer):
@@ -59,5 +57,28 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = (
             "id", "title", "description", "assigned_to", "status",
             "submitted_file", "created_at", "updated_at",
-            "time_limit_minutes", "review_status", "started_at", "time_taken"
+            "time_limit_minutes", "review_status", "started_at", "deadline", "time_taken"
         )
+
+
+class BulkAssignSerializer(serializers.Serializer):
+    submitted_file = serializers.PrimaryKeyRelatedField(
+        queryset=SubmittedMarkdownFile.objects.select_related('modified_file__original_file')
+    )
+    department = serializers.ChoiceField(choices=User.DEPARTMENT_CHOICES, required=False)
+    lab_part = serializers.ChoiceField(choices=User.LAB_PART_CHOICES, required=False)
+    project = serializers.CharField(required=False)
+    knox_ids = serializers.ListField(child=serializers.CharField(max_length=50), required=False, allow_empty=False)
+    title = serializers.CharField(max_length=100, required=False)
+    description = serializers.CharField(max_length=255, required=False)
+    time_limit_minutes = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if not any(attrs.get(key) for key in ('department', 'lab_part', 'project', 'knox_ids')):
+            raise serializers.ValidationError('Select users by department, lab_part, project or knox_ids')
+        return attrs
+
+
+class BatchReviewSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=10000)
+    review_status = serializers.ChoiceField(choices=[('passed', 'Passed'), ('failed', 'Failed')])
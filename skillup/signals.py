@@ -0,0 +1,102 @@
+from functools import partial
+
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import search
+from .backends import bump_users_version, cache_user, forget_user
+from .models import MarkdownFile, ModifiedMarkdownFile, User
+from .storage import add_reference, remove_reference
+
+
+@receiver(post_save, sender=User)
+def refresh_cached_user(sender, instance, update_fields=None, **kwargs):
+    cache_user(instance)
+    # logins only touch last_login, which no task response shows
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_users_version()
+
+
+@receiver(post_delete, sender=User)
+def drop_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+    bump_users_version()
+
+
+@receiver(user_logged_in)
+def cache_logged_in_user(sender, request, user, **kwargs):
+    cache_user(user)
+
+
+@receiver(user_logged_out)
+def drop_logged_out_user(sender, request, user, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+
+def _stored_name(instance):
+    # None when the file field was deferred and never loaded
+    value = instance.__dict__.get(instance.summarized_field)
+    if value is None and instance.summarized_field not in instance.__dict__:
+        return None
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=MarkdownFile)
+@receiver(post_init, sender=ModifiedMarkdownFile)
+def remember_stored_name(sender, instance, **kwargs):
+    instance._stored_name = _stored_name(instance)
+
+
+@receiver(post_init, sender=ModifiedMarkdownFile)
+def remember_delta_base(sender, instance, **kwargs):
+    # None when original_file was deferred and never loaded
+    instance._delta_base = instance.__dict__.get('original_file_id')
+
+
+@receiver(post_save, sender=MarkdownFile)
+@receiver(post_save, sender=ModifiedMarkdownFile)
+def count_blob_references(sender, instance, created, **kwargs):
+    previous, current = '' if created else instance._stored_name, _stored_name(instance)
+    if current is None or previous == current:
+        return
+    add_reference(current)
+    if previous:
+        remove_reference(previous)
+    instance._stored_name = current
+
+
+@receiver(post_delete, sender=MarkdownFile)
+@receiver(post_delete, sender=ModifiedMarkdownFile)
+def release_blob_reference(sender, instance, **kwargs):
+    remove_reference(instance._stored_name)
+
+
+def _search_state(instance):
+    return instance.__dict__.get('content_hash'), instance.__dict__.get('title')
+
+
+@receiver(post_init, sender=MarkdownFile)
+@receiver(post_init, sender=ModifiedMarkdownFile)
+def remember_search_state(sender, instance, **kwargs):
+    instance._search_state = _search_state(instance)
+
+
+@receiver(post_save, sender=MarkdownFile)
+@receiver(post_save, sender=ModifiedMarkdownFile)
+def update_search_index(sender, instance, created, **kwargs):
+    previous, current = instance._search_state, _search_state(instance)
+    if not created and previous == current:
+        return
+    transaction.on_commit(partial(search.index, instance))
+    if sender is MarkdownFile and not created and previous[1] != current[1]:
+        transaction.on_commit(partial(search.retitle, instance))
+    instance._search_state = current
+
+
+@receiver(post_delete, sender=MarkdownFile)
+@receiver(post_delete, sender=ModifiedMarkdownFile)
+def remove_from_search_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(search.unindex, sender, instance.pk))
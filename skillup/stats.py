@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Task, TaskStat, TaskTimeBucket
+
+PERCENTILES = (50, 90, 95, 99)
+
+# TaskStat/TaskTimeBucket are kept in step with every write to skillup_task,
+# and with department/lab_part changes on skillup_user, by SQLite triggers
+# that migrations 0006_task_stats and 0011_task_stats_user_group_trigger
+# install. They also see bulk_create() and queryset update() calls that never
+# reach Django signals. Change them with a new migration.
+
+
+def rebuild():
+    """Recompute both summary tables from skillup_task."""
+    department = Coalesce('assigned_to__department', Value(''))
+    lab_part = Coalesce('assigned_to__lab_part', Value(''))
+    tasks = Task.objects.annotate(stat_department=department, stat_lab_part=lab_part)
+
+    stats = [
+        TaskStat(department=row['stat_department'], lab_part=row['stat_lab_part'], status=row['status'],
+                 review_status=row['review_status'], task_count=row['task_count'],
+                 timed_count=row['timed_count'], time_taken_sum=row['time_taken_sum'] or 0)
+        for row in tasks.values('stat_department', 'stat_lab_part', 'status', 'review_status').annotate(
+            task_count=Count('id'),
+            timed_count=Count('id', filter=Q(time_taken__isnull=False)),
+            time_taken_sum=Sum('time_taken'),
+        )
+    ]
+    buckets = [
+        TaskTimeBucket(department=row['stat_department'], lab_part=row['stat_lab_part'],
+                       bucket=row['bucket'], task_count=row['task_count'])
+        for row in tasks.filter(time_taken__isnull=False)
+        .annotate(bucket=Coalesce('time_taken', 0) / TaskTimeBucket.TIME_BUCKET_SECONDS)
+        .values('stat_department', 'stat_lab_part', 'bucket').annotate(task_count=Count('id'))
+    ]
+
+    with transaction.atomic():
+        TaskStat.objects.all().delete()
+        TaskTimeBucket.objects.all().delete()
+        TaskStat.objects.bulk_create(stats)
+        TaskTimeBucket.objects.bulk_create(buckets)
+    return len(stats), len(buckets)
+
+
+def _percentiles(buckets):
+    total = sum(count for _, count in buckets)
+    result = dict.fromkeys(PERCENTILES)
+    if not total:
+        return result
+    seen = 0
+    pending = list(PERCENTILES)
+    for bucket, count in sorted(buckets):
+        seen += count
+        while pending and seen * 100 >= pending[0] * total:
+            # upper edge of the bucket holding the percentile
+            result[pending.pop(0)] = (bucket + 1) * TaskTimeBucket.TIME_BUCKET_SECONDS
+    return result
+
+
+def summary():
+    """Dashboard numbers read straight from the summary tables."""
+    counts = []
+    timing = {}
+    for stat in TaskStat.objects.filter(task_count__gt=0).order_by('department', 'lab_part', 'status',
+                                                                   'review_status'):
+        counts.append({
+            'department': stat.department, 'lab_part': stat.lab_part,
+            'status': stat.status, 'review_status': stat.review_status, 'count': stat.task_count,
+        })
+        group = timing.setdefault((stat.department, stat.lab_part), {'timed': 0, 'sum': 0, 'buckets': []})
+        group['timed'] += stat.timed_count
+        group['sum'] += stat.time_taken_sum
+
+    for bucket in TaskTimeBucket.objects.filter(task_count__gt=0):
+        group = timing.setdefault((bucket.department, bucket.lab_part), {'timed': 0, 'sum': 0, 'buckets': []})
+        group['buckets'].append((bucket.bucket, bucket.task_count))
+
+    time_taken = []
+    for (department, lab_part), group in sorted(timing.items()):
+        percentiles = _percentiles(group['buckets'])
+        time_taken.append({
+            'department': department, 'lab_part': lab_part,
+            'average': group['sum'] / group['timed'] if group['timed'] else None,
+            **{f'p{p}': value for p, value in percentiles.items()},
+        })
+    return {'counts': counts, 'time_taken': time_taken}
@@ -0,0 +1,85 @@
+"""Content-addressed storage for uploaded markdown.
+
+Files are saved under the SHA-256 of their content, so uploading the same
+guide twice stores it once and every row points at the same blob. Rows count
+their references in StoredBlob; blobs are only removed by the gc_blobs
+command, never when a row goes away.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.db.models import Count, F
+
+BLOB_DIR = 'blobs'
+
+
+def markdown_storage():
+    return storages['markdown']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, content_hash, name):
+        extension = os.path.splitext(name or '')[1].lower()
+        return f'{BLOB_DIR}/{content_hash[:2]}/{content_hash}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # set by SummarizedFileModel, which has already hashed the upload
+        content_hash = getattr(content, 'content_hash', None)
+        if not content_hash:
+            digest = hashlib.sha256()
+            for chunk in content.chunks():
+                digest.update(chunk)
+            content_hash = digest.hexdigest()
+        blob = self.blob_name(content_hash, name)
+        try:
+            # a fresh mtime restarts gc_blobs' grace period while the new row commits
+            os.utime(self.path(blob))
+            return blob
+        except FileNotFoundError:
+            pass
+        saved = super().save(blob, content, max_length)
+        if saved != blob:
+            # another upload of the same content won the race
+            self.delete(saved)
+        return blob
+
+
+def add_reference(name):
+    from .models import StoredBlob
+    if not name:
+        return
+    if not StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + 1):
+        blob, created = StoredBlob.objects.get_or_create(name=name, defaults={'ref_count': 1})
+        if not created:
+            StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+
+
+def remove_reference(name):
+    from .models import StoredBlob
+    if name:
+        StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') - 1)
+
+
+def stored_file_fields():
+    """(model, field name) of every file field kept in the markdown storage."""
+    from .models import MarkdownFile, ModifiedMarkdownFile
+    return [(MarkdownFile, 'file'), (ModifiedMarkdownFile, 'modified_file')]
+
+
+def recount_references(blob_model, file_fields):
+    """Rebuild every ref_count from the rows; takes models so migrations can pass historical ones."""
+    counts = {}
+    for model, field in file_fields:
+        rows = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+        for row in rows.values(field).annotate(n=Count('pk')):
+            counts[row[field]] = counts.get(row[field], 0) + row['n']
+    blob_model.objects.exclude(name__in=list(counts)).update(ref_count=0)
+    for name, ref_count in counts.items():
+        blob_model.objects.update_or_create(name=name, defaults={'ref_count': ref_count})
+    return len(counts)
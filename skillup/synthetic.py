@@ -0,0 +1,79 @@
+"""Synthetic users, tasks and markdown for load tests and query-budget tests."""
+from datetime import timedelta
+
+from .models import Task, User
+
+PROJECTS = ['Atlas', 'Borealis', 'Cobalt', 'Delta', 'Ember', 'Fjord', 'Granite', 'Helix']
+# share of generated tasks per (status, review_status)
+TASK_MIX = [
+    (('assigned', 'pending'), 30),
+    (('ongoing', 'pending'), 15),
+    (('submitted', 'pending'), 15),
+    (('done', 'pending'), 12),
+    (('done', 'passed'), 12),
+    (('done', 'failed'), 6),
+    (('failed', 'pending'), 10),
+]
+WORDS = ('configure deploy cluster node pod service ingress volume secret build image container registry '
+         'pipeline stage test verify rollback metric alert log trace network route firewall policy user '
+         'group permission backup restore snapshot schedule job queue worker cache index query').split()
+
+
+def iter_users(rng, count, prefix, password_hash, start=0):
+    departments = [value for value, _ in User.DEPARTMENT_CHOICES]
+    lab_parts = [value for value, _ in User.LAB_PART_CHOICES]
+    for number in range(start, start + count):
+        knox_id = f'{prefix}{number:07d}'
+        yield User(knox_id=knox_id, email=f'{knox_id}@example.com', password=password_hash, is_active=True,
+                   department=rng.choice(departments), lab_part=rng.choice(lab_parts),
+                   project=rng.choice(PROJECTS))
+
+
+def iter_tasks(rng, count, user_ids, submitted_ids, now):
+    """Tasks in a realistic mix of states, with the tracking fields each state implies."""
+    states = [state for state, _ in TASK_MIX]
+    weights = [weight for _, weight in TASK_MIX]
+    for _ in range(count):
+        status, review_status = rng.choices(states, weights)[0]
+        time_limit = rng.choice((15, 30, 45, 60, 90))
+        task = Task(
+            title=f'Lab {rng.randint(1, 400)}: {rng.choice(WORDS)} {rng.choice(WORDS)}',
+            description=' '.join(rng.choices(WORDS, k=12)),
+            assigned_to_id=rng.choice(user_ids),
+            submitted_file_id=rng.choice(submitted_ids) if submitted_ids and rng.random() < 0.8 else None,
+            status=status, review_status=review_status, time_limit_minutes=time_limit,
+        )
+        if status != 'assigned':
+            task.started_at = now - timedelta(minutes=rng.randint(1, 60 * 24 * 90))
+            task.deadline = task.started_at + timedelta(minutes=time_limit)
+        if status in ('submitted', 'done'):
+            task.time_taken = rng.randint(60, time_limit * 60)
+        yield task
+
+
+def markdown_document(rng, size):
+    """Roughly size bytes of lab-guide markdown: headed sections of prose, lists and code."""
+    parts, total, section = [], 0, 0
+    while total < size:
+        section += 1
+        lines = [f'## Step {section}: {rng.choice(WORDS)} the {rng.choice(WORDS)}', '']
+        lines.append(' '.join(rng.choices(WORDS, k=rng.randint(20, 80))) + '.')
+        lines.append('')
+        lines += [f'- {rng.choice(WORDS)} {rng.choice(WORDS)}' for _ in range(rng.randint(2, 6))]
+        lines.append('')
+        if rng.random() < 0.5:
+            lines += ['```bash'] + [f'kubectl {rng.choice(WORDS)} {rng.choice(WORDS)}-{rng.randint(1, 99)}'
+                                    for _ in range(rng.randint(2, 10))] + ['```', '']
+        text = '\n'.join(lines) + '\n'
+        parts.append(text)
+        total += len(text)
+    return f'# Lab guide {rng.randint(1, 9999)}\n\n' + ''.join(parts)
+
+
+def modify_document(rng, text):
+    """A copy with a few lines changed, the way an admin adapts a guide for a cohort."""
+    lines = text.splitlines(keepends=True)
+    for _ in range(rng.randint(1, 5)):
+        index = rng.randrange(len(lines))
+        lines[index] = f'Note for this cohort: {rng.choice(WORDS)} {rng.choice(WORDS)}.\n'
+    return ''.join(lines)
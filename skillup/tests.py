@@ -1,3 +1,1292 @@
-from django.test import TestCase
+import difflib
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+from contextlib import closing
+from datetime import timedelta
+from importlib import import_module
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import markdown  # type: ignore
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, get_hasher
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models import Count, Max
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.instrumentation import InstrumentationMiddleware, registry
+from core.routers import REPLICA_DB_ALIAS, STICKY_COOKIE, ReadReplicaMiddleware
+from core.static_assets import PrecompressedStaticMiddleware, ReferencedFileSystemFinder
+
+from . import deltas, markdown_cache, markdown_sections, search, stats, synthetic
+from .assignment import bulk_assign
+from .backends import USER_CACHE_KEY, users_version
+from .checks import check_shared_default_cache
+from .models import (
+    MarkdownFile, ModifiedMarkdownFile, StoredBlob, SubmittedMarkdownFile, Task, TaskStat, TaskTimeBucket, User,
+)
+from .storage import markdown_storage
+from .review import review_tasks
+from .tokens import issue_tokens
+from .transitions import expire_overdue
+from .user_import import clean_row, import_users, read_rows
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class TaskQueryPlanTests(TestCase):
+    # "SCAN skillup_task" without "USING ... INDEX" means SQLite walks the whole table
+    FULL_SCAN = re.compile(r'\bSCAN skillup_task\b(?! USING)')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('student', 'student@example.com', 'password123')
+        Task.objects.create(title='task', assigned_to=cls.user)
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        self.assertIsNone(self.FULL_SCAN.search(plan), f'full scan of skillup_task:\n{plan}\n{queryset.query}')
+
+    def assertAggregateNoFullScan(self, queryset, **aggregates):
+        with CaptureQueriesContext(connection) as queries:
+            queryset.aggregate(**aggregates)
+        self.assertEqual(len(queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = '\n'.join(row[-1] for row in cursor.fetchall())
+        self.assertIsNone(self.FULL_SCAN.search(plan), f'full scan of skillup_task:\n{plan}\n{queries[0]["sql"]}')
+
+    def test_student_dashboard(self):
+        self.assertNoFullScan(Task.objects.filter(assigned_to=self.user, status='ongoing'))
+
+    def test_student_task_list(self):
+        self.assertNoFullScan(Task.objects.filter(assigned_to=self.user).order_by('created_at', 'id')[:50])
+
+    def test_staff_task_list(self):
+        self.assertNoFullScan(Task.objects.order_by('created_at', 'id')[:50])
+
+    def test_staff_task_list_next_page(self):
+        now = timezone.now()
+        self.assertNoFullScan(Task.objects.filter(created_at__gte=now).exclude(created_at=now, id__lte=1)
+                              .order_by('created_at', 'id')[:50])
+
+    def test_review_queue(self):
+        self.assertNoFullScan(Task.objects.filter(status='done', review_status='pending').order_by('updated_at'))
+
+    def test_admin_status_filter(self):
+        self.assertNoFullScan(Task.objects.filter(status='submitted'))
+
+    def test_admin_review_status_filter(self):
+        self.assertNoFullScan(Task.objects.filter(review_status='passed'))
+
+    def test_admin_assigned_to_filter(self):
+        self.assertNoFullScan(Task.objects.filter(assigned_to=self.user).order_by('-id'))
+
+    def test_deadline_sweeper(self):
+        self.assertNoFullScan(Task.objects.filter(status='ongoing', deadline__lt=timezone.now()).order_by('deadline'))
+
+    def test_student_list_version(self):
+        self.assertAggregateNoFullScan(Task.objects.filter(assigned_to=self.user),
+                                       count=Count('pk'), last_modified=Max('updated_at'))
+
+    def test_staff_list_version(self):
+        self.assertAggregateNoFullScan(Task.objects.all(), count=Count('pk'), last_modified=Max('updated_at'))
+
+
+class MediaTestCase(TestCase):
+    """Uploads go to a temporary MEDIA_ROOT that is removed after the class."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = cls.enterClassContext(TemporaryDirectory())
+        # plain static storage: tests run without a collectstatic manifest
+        storages = {**settings.STORAGES, 'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        }}
+        cls.enterClassContext(override_settings(MEDIA_ROOT=media_root, STORAGES=storages))
+        super().setUpClass()
+
+
+class CostBudgetTestCase(MediaTestCase):
+    """Query and file-read budgets that must not depend on the number of rows.
+
+    assertFlatCost runs a request against one row of everything, grows every
+    table to ROWS rows and runs it again. Both runs have to fit the budget
+    and cost exactly the same, so an N+1 in a serializer or a per-row file
+    read in list_display fails here rather than in production.
+    """
+    ROWS = 1000
+    SEED = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(cls.SEED)
+        cls.admin = User.objects.create_superuser('budget-admin', 'budget-admin@example.com', 'password123')
+        cls.student = User.objects.create_user('budget-student', 'budget-student@example.com', 'password123')
+        text = synthetic.markdown_document(rng, 4_000)
+        cls.original = MarkdownFile(title='Budget guide', file=ContentFile(text.encode(), name='guide.md'))
+        cls.original.save()
+        cls.modified = ModifiedMarkdownFile(
+            original_file=cls.original, modified_by=cls.admin,
+            modified_file=ContentFile(synthetic.modify_document(rng, text).encode(), name='modified.md'),
+        )
+        cls.modified.save()
+        cls.submitted = SubmittedMarkdownFile.objects.create(modified_file=cls.modified)
+        cls.task = Task.objects.create(title='Budget task', assigned_to=cls.student, submitted_file=cls.submitted)
+
+    def setUp(self):
+        self.student_headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.student)['access']}"}
+        self.admin_headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.admin)['access']}"}
+
+    def grow(self):
+        """Copies of the fixture rows until every table holds ROWS of them."""
+        rng = random.Random(self.SEED)
+        extra = self.ROWS - 1
+        User.objects.bulk_create(synthetic.iter_users(rng, extra, 'budget-', '!'))
+        summary = {field: getattr(self.original, field) for field in ('content_hash', 'preview', 'size', 'line_count')}
+        originals = MarkdownFile.objects.bulk_create(
+            MarkdownFile(title=f'Budget guide {number}', file=self.original.file.name, **summary)
+            for number in range(extra)
+        )
+        summary = {field: getattr(self.modified, field)
+                   for field in ('content_hash', 'preview', 'size', 'line_count', 'delta')}
+        # one submitted and one unsubmitted modification per guide, so both admin lists grow
+        modified = ModifiedMarkdownFile.objects.bulk_create(
+            ModifiedMarkdownFile(original_file=original, modified_by=self.admin,
+                                 modified_file=self.modified.modified_file.name, **summary)
+            for original in originals for _ in range(2)
+        )
+        submitted = SubmittedMarkdownFile.objects.bulk_create(
+            SubmittedMarkdownFile(modified_file=row) for row in modified[::2]
+        )
+        Task.objects.bulk_create(synthetic.iter_tasks(
+            rng, extra, [self.student.pk], [row.pk for row in submitted], timezone.now()
+        ))
+
+    def measure(self, request):
+        # every run starts cold, so cached work cannot hide in one of the two
+        for cache in caches.all():
+            cache.clear()
+        opened = []
+        storage_open = Storage.open
+
+        def counted_open(storage, name, mode='rb'):
+            opened.append(name)
+            return storage_open(storage, name, mode)
+
+        with mock.patch.object(Storage, 'open', counted_open), CaptureQueriesContext(connection) as queries:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, response)
+        return [query['sql'] for query in queries], opened
+
+    def assertFlatCost(self, request, max_queries, max_file_reads=0):
+        small_queries, small_reads = self.measure(request)
+        self.grow()
+        queries, reads = self.measure(request)
+        details = '\n'.join(queries + reads)
+        self.assertLessEqual(len(queries), max_queries, f'query budget exceeded:\n{details}')
+        self.assertLessEqual(len(reads), max_file_reads, f'file read budget exceeded:\n{details}')
+        self.assertEqual((len(queries), len(reads)), (len(small_queries), len(small_reads)),
+                         f'cost grows with the number of rows:\n{details}')
+
+
+class ApiCostTests(CostBudgetTestCase):
+    def test_login(self):
+        # a fresh client each time, so neither run already has a session to rotate
+        self.assertFlatCost(lambda: self.client_class().post(
+            '/hybrid-login/', {'knox_id': 'budget-student', 'password': 'password123'},
+            content_type='application/json',
+        ), max_queries=9)
+
+    def test_profile(self):
+        self.assertFlatCost(lambda: self.client.get('/users/profile/', **self.student_headers), max_queries=0)
+
+    def test_student_task_list(self):
+        self.assertFlatCost(lambda: self.client.get('/api/tasks/', **self.student_headers), max_queries=2)
+
+    def test_staff_task_list(self):
+        self.assertFlatCost(lambda: self.client.get('/api/tasks/', **self.admin_headers), max_queries=2)
+
+    def test_task_retrieve(self):
+        self.assertFlatCost(lambda: self.client.get(f'/api/tasks/{self.task.pk}/', **self.student_headers),
+                            max_queries=2)
+
+    def test_task_start(self):
+        tasks = iter([self.task.pk, Task.objects.create(title='Second task', assigned_to=self.student).pk])
+        self.assertFlatCost(lambda: self.client.post(f'/api/tasks/{next(tasks)}/start/', **self.student_headers),
+                            max_queries=1)
+
+    def test_task_detail_page(self):
+        self.client.force_login(self.student)
+        self.assertFlatCost(lambda: self.client.get(f'/task/detail/{self.task.pk}/'), max_queries=4, max_file_reads=1)
+
+    def test_task_markdown_stream(self):
+        self.client.force_login(self.student)
+        self.assertFlatCost(lambda: self.client.get(f'/task/detail/{self.task.pk}/markdown/'),
+                            max_queries=4, max_file_reads=1)
+
+    def test_task_markdown_sections(self):
+        self.client.force_login(self.student)
+        self.assertFlatCost(lambda: self.client.get(f'/task/detail/{self.task.pk}/markdown/sections/'),
+                            max_queries=4, max_file_reads=1)
+
+    def test_task_markdown_section(self):
+        self.client.force_login(self.student)
+        self.assertFlatCost(lambda: self.client.get(f'/task/detail/{self.task.pk}/markdown/sections/1/'),
+                            max_queries=4, max_file_reads=1)
+
+    def test_markdown_file_list(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/md-files/', **self.admin_headers), max_queries=2)
+
+    def test_modified_markdown_file_list(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/modified-md-files/', **self.admin_headers),
+                            max_queries=2)
+
+    def test_modified_markdown_diff(self):
+        self.assertFlatCost(lambda: self.client.get(f'/api/admin/modified-md-files/{self.modified.pk}/diff/',
+                                                    **self.admin_headers), max_queries=2, max_file_reads=1)
+
+    def test_submitted_markdown_file_list(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/submitted-md-files/', **self.admin_headers),
+                            max_queries=2)
+
+    def test_task_stats(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/task-stats/', **self.admin_headers), max_queries=3)
+
+    def test_markdown_cache_stats(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/markdown-cache-stats/', **self.admin_headers),
+                            max_queries=1)
+
+    def test_markdown_search(self):
+        self.assertFlatCost(lambda: self.client.get('/api/admin/markdown-search/?q=cluster', **self.admin_headers),
+                            max_queries=2)
+
+
+class AdminCostTests(CostBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def test_user_changelist(self):
+        self.assertFlatCost(lambda: self.client.get('/admin/skillup/user/'), max_queries=5)
+
+    def test_task_changelist(self):
+        self.assertFlatCost(lambda: self.client.get('/admin/skillup/task/'), max_queries=6)
+
+    def test_markdown_file_changelist(self):
+        self.assertFlatCost(lambda: self.client.get('/admin/skillup/markdownfile/'), max_queries=5)
+
+    def test_modified_markdown_file_changelist(self):
+        self.assertFlatCost(lambda: self.client.get('/admin/skillup/modifiedmarkdownfile/'), max_queries=5)
+
+    def test_submitted_markdown_file_changelist(self):
+        self.assertFlatCost(lambda: self.client.get('/admin/skillup/submittedmarkdownfile/'), max_queries=5)
+
+
+class TokenRefreshTests(TestCase):
+    def test_refresh_drops_revoked_staff_access(self):
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password123', is_staff=True)
+        tokens = issue_tokens(staff)
+        self.assertNotIn('is_staff', RefreshToken(tokens['refresh']).payload)
+        review = {'ids': [1], 'review_status': 'passed'}
+        response = self.client.post('/api/tasks/review/', review, content_type='application/json',
+                                    HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(response.status_code, 200)
+
+        staff.is_staff = False
+        staff.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': tokens['refresh']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/tasks/review/', review, content_type='application/json',
+                                    HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(response.status_code, 403)
+
+    def test_refresh_rejects_deactivated_user(self):
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        refresh = issue_tokens(student)['refresh']
+        student.is_active = False
+        student.save()
+        response = self.client.post('/api/token/refresh/', {'refresh': refresh}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+def numbered_guide(name, count=200):
+    return ''.join(f'{name} line {number}\n' for number in range(count))
+
+
+class ModifiedMarkdownFileTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        cls.original = MarkdownFile(title='Guide A', file=ContentFile(numbered_guide('A').encode(), name='a.md'))
+        cls.original.save()
+        cls.other = MarkdownFile(title='Guide B', file=ContentFile(numbered_guide('B').encode(), name='b.md'))
+        cls.other.save()
+
+    def create_modified(self, content, original=None):
+        content = content.encode() if isinstance(content, str) else content
+        modified = ModifiedMarkdownFile(original_file=original or self.original, modified_by=self.admin,
+                                        modified_file=ContentFile(content, name='modified.md'))
+        modified.save()
+        return modified
+
+    def edited_guide(self):
+        lines = numbered_guide('A').encode().splitlines(keepends=True)
+        lines[5] = b'LINE FIVE\n'
+        del lines[40:43]
+        lines[120:120] = [b'inserted\n', b'not utf-8 \xff\xfe\n']
+        return b''.join(lines)
+
+    def test_delta_round_trip(self):
+        content = self.edited_guide()
+        modified = self.create_modified(content)
+        self.assertTrue(modified.delta)
+        self.assertFalse(modified.modified_file)
+        self.assertEqual(deltas.decode(modified.delta), modified.get_ops())
+        self.assertEqual(b''.join(modified.iter_content_lines()), content)
+        self.assertEqual(modified.read_content(), content)
+        self.assertEqual(modified.content_hash, hashlib.sha256(content).hexdigest())
+
+    def test_unified_diff_matches_difflib(self):
+        content = self.edited_guide()
+        modified = self.create_modified(content)
+        expected = difflib.unified_diff(
+            numbered_guide('A').splitlines(keepends=True),
+            content.decode('utf-8', 'replace').splitlines(keepends=True), 'a.md', 'modified',
+        )
+        diff = deltas.iter_unified_diff(self.original.file, modified.get_ops(), fromfile='a.md', tofile='modified')
+        self.assertEqual(''.join(diff), ''.join(expected))
+
+    def test_store_in_full_then_as_delta(self):
+        content = self.edited_guide()
+        modified = self.create_modified(content)
+        modified.store_in_full()
+        modified = ModifiedMarkdownFile.objects.get(pk=modified.pk)
+        self.assertEqual(modified.delta, '')
+        self.assertEqual(StoredBlob.objects.get(name=modified.modified_file.name).ref_count, 1)
+        self.assertEqual(modified.read_content(), content)
+
+        stored_name = modified.modified_file.name
+        self.assertGreater(modified.store_as_delta(), 0)
+        modified = ModifiedMarkdownFile.objects.get(pk=modified.pk)
+        self.assertTrue(modified.delta)
+        self.assertEqual(StoredBlob.objects.get(name=stored_name).ref_count, 0)
+        self.assertEqual(b''.join(modified.iter_content_lines()), content)
+        self.assertIsNone(modified.store_as_delta())
+
+    def test_store_as_delta_skips_larger_deltas(self):
+        modified = self.create_modified(numbered_guide('B'))
+        self.assertEqual(modified.delta, '')
+        self.assertIsNone(modified.store_as_delta())
+
+    def test_sections_of_a_delta_stream_without_the_whole_document(self):
+        text = synthetic.markdown_document(random.Random(7), 20_000)
+        original = MarkdownFile(title='Sections', file=ContentFile(text.encode(), name='sections.md'))
+        original.save()
+        content = synthetic.modify_document(random.Random(8), text).encode()
+        modified = self.create_modified(content, original)
+        self.assertTrue(modified.delta)
+        caches['markdown'].clear()
+
+        index = markdown_sections.get_index(modified)
+        self.assertEqual(index, markdown_sections.build_index(content.splitlines(keepends=True)))
+        for number, (offset, length, _) in enumerate(index):
+            self.assertEqual(modified.read_range(offset, length), content[offset:offset + length])
+        html = markdown_sections.render_section(modified, index, 2)
+        self.assertEqual(html, markdown.markdown(content[index[2][0]:index[2][0] + index[2][1]].decode()))
+        self.assertIsNone(caches['markdown'].get(markdown_cache.SOURCE_KEY_PREFIX + modified.content_hash))
+
+    def test_repointing_a_delta_keeps_its_content(self):
+        text = numbered_guide('A').replace('A line 5\n', 'LINE FIVE\n')
+        modified = self.create_modified(text)
+        self.assertTrue(modified.delta)
+        content_hash = modified.content_hash
+
+        modified = ModifiedMarkdownFile.objects.get(pk=modified.pk)
+        modified.original_file = self.other
+        modified.save()
+
+        modified = ModifiedMarkdownFile.objects.get(pk=modified.pk)
+        self.assertEqual(modified.read_content(), text.encode())
+        self.assertEqual(modified.content_hash, content_hash)
+
+
+class MarkdownCacheTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        cls.original = MarkdownFile(title='Guide', file=ContentFile(numbered_guide('A').encode(), name='a.md'))
+        cls.original.save()
+        cls.modified = ModifiedMarkdownFile(original_file=cls.original, modified_by=cls.admin, modified_file=ContentFile(
+            numbered_guide('A').replace('A line 7', 'A line seven').encode(), name='modified.md'))
+        cls.modified.save()
+        submitted = SubmittedMarkdownFile.objects.create(modified_file=cls.modified)
+        cls.task = Task.objects.create(title='task', assigned_to=cls.admin, submitted_file=submitted)
+
+    def setUp(self):
+        markdown_cache.get_cache().clear()
+
+    def render(self):
+        task = Task.objects.select_related('submitted_file__modified_file__original_file').get(pk=self.task.pk)
+        return markdown_cache.render_task_markdown(task)
+
+    def cached(self, content_hash):
+        return markdown_cache.get_cache().get(markdown_cache.KEY_PREFIX + content_hash)
+
+    def test_hit_and_miss_counters(self):
+        self.assertEqual(markdown_cache.stats(), {'hits': 0, 'misses': 0})
+        html = self.render()
+        self.assertIn('A line seven', html)
+        self.assertEqual(markdown_cache.stats(), {'hits': 0, 'misses': 1})
+        with mock.patch.object(markdown, 'markdown') as render:
+            self.assertEqual(self.render(), html)
+            self.assertEqual(self.render(), html)
+        render.assert_not_called()
+        self.assertEqual(markdown_cache.stats(), {'hits': 2, 'misses': 1})
+
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.admin)['access']}"}
+        response = self.client.get('/api/admin/markdown-cache-stats/', **headers)
+        self.assertEqual(response.json(), {'hits': 2, 'misses': 1})
+
+    def test_replacing_the_modified_file_invalidates(self):
+        self.render()
+        old_hash = self.modified.content_hash
+        self.assertIsNotNone(self.cached(old_hash))
+
+        modified = ModifiedMarkdownFile.objects.get(pk=self.modified.pk)
+        modified.modified_file = ContentFile(numbered_guide('A').replace('A line 9', 'A line nine').encode(),
+                                             name='modified.md')
+        modified.save()
+        self.assertNotEqual(modified.content_hash, old_hash)
+        self.assertIsNone(self.cached(old_hash))
+        html = self.render()
+        self.assertIn('A line nine', html)
+        self.assertNotIn('A line seven', html)
+        self.assertEqual(markdown_cache.stats(), {'hits': 0, 'misses': 2})
+
+    def test_replacing_the_original_file_keeps_the_modification(self):
+        self.assertTrue(self.modified.delta)
+        html = self.render()
+        original = MarkdownFile.objects.get(pk=self.original.pk)
+        original.file = ContentFile(numbered_guide('B').encode(), name='b.md')
+        original.save()
+
+        # the delta was stored in full first, so the content and its cache key are unchanged
+        modified = ModifiedMarkdownFile.objects.get(pk=self.modified.pk)
+        self.assertEqual((modified.delta, modified.content_hash), ('', self.modified.content_hash))
+        self.assertEqual(self.render(), html)
+        markdown_cache.get_cache().clear()
+        self.assertEqual(self.render(), html)
+
+
+class BackfillFileSummariesTests(MediaTestCase):
+    SUMMARY = ('content_hash', 'preview', 'size', 'line_count')
+
+    @classmethod
+    def setUpTestData(cls):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        cls.original = MarkdownFile(title='Guide', file=ContentFile(numbered_guide('A').encode(), name='a.md'))
+        cls.original.save()
+        cls.full = ModifiedMarkdownFile(original_file=cls.original, modified_by=admin,
+                                        modified_file=ContentFile(numbered_guide('B').encode(), name='b.md'))
+        cls.full.save()
+        cls.delta = ModifiedMarkdownFile(original_file=cls.original, modified_by=admin, modified_file=ContentFile(
+            numbered_guide('A').replace('A line 7', 'A line seven').encode(), name='a.md'))
+        cls.delta.save()
+
+    def summaries(self):
+        return {(model.__name__, row[0]): row[1:] for model in (MarkdownFile, ModifiedMarkdownFile)
+                for row in model.objects.values_list('pk', *self.SUMMARY)}
+
+    def backfill(self):
+        stdout = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('backfill_file_summaries', stdout=stdout)
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        return stdout.getvalue(), updates
+
+    def test_backfills_missing_summaries_once(self):
+        self.assertTrue(self.delta.delta)
+        expected = self.summaries()
+        MarkdownFile.objects.update(content_hash='', preview='', size=0, line_count=0)
+        ModifiedMarkdownFile.objects.update(content_hash='', preview='', size=0, line_count=0)
+
+        output, updates = self.backfill()
+        self.assertIn('MarkdownFile: 1 updated, 0 missing files', output)
+        self.assertIn('ModifiedMarkdownFile: 2 updated, 0 missing files', output)
+        self.assertEqual(len(updates), 3)
+        self.assertEqual(self.summaries(), expected)
+
+        output, updates = self.backfill()
+        self.assertIn('MarkdownFile: 0 updated', output)
+        self.assertIn('ModifiedMarkdownFile: 0 updated', output)
+        self.assertEqual(updates, [])
+        self.assertEqual(self.summaries(), expected)
+
+
+class CachedSessionTests(TestCase):
+    def test_authenticated_idle_request_costs_no_queries(self):
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.client.force_login(student)
+        with self.assertNumQueries(0):
+            response = self.client.get('/users/profile/')
+        self.assertEqual(response.json()['knox_id'], 'student')
+
+    def test_bulk_deactivation_drops_cached_users(self):
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        other = User.objects.create_user('other', 'other@example.com', 'password123')
+        self.client.force_login(student)
+        self.assertEqual(self.client.get('/users/profile/').status_code, 200)
+        version = users_version()
+
+        User.objects.filter(knox_id__in=['student', 'other']).update(is_active=False)
+        self.assertIsNone(caches['default'].get(USER_CACHE_KEY.format(student.pk)))
+        self.assertNotEqual(users_version(), version)
+        self.assertIn(self.client.get('/users/profile/').status_code, (401, 403))
+
+        other.is_active = True
+        User.objects.bulk_update([other], ['is_active'])
+        self.assertIsNone(caches['default'].get(USER_CACHE_KEY.format(other.pk)))
+
+    def test_per_process_cache_fails_check_with_several_workers(self):
+        self.assertEqual(check_shared_default_cache(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([error.id for error in check_shared_default_cache(None)], ['skillup.E001'])
+        shared = {**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                                 'LOCATION': 'redis://localhost:6379'}}
+        with override_settings(WEB_CONCURRENCY=4, CACHES=shared):
+            self.assertEqual(check_shared_default_cache(None), [])
+
+
+class StaticAssetsTests(SimpleTestCase):
+    """collectstatic into a temporary STATIC_ROOT, served by PrecompressedStaticMiddleware."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = cls.enterClassContext(TemporaryDirectory())
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed = staticfiles_storage.stored_name('bsbmaterial/css/style.css')
+
+    def setUp(self):
+        self.middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse(status=404))
+
+    def get(self, path, **headers):
+        return self.middleware(RequestFactory().get(path, **headers))
+
+    def test_only_referenced_files_are_collected(self):
+        listed = {path.replace(os.sep, '/') for path, _ in ReferencedFileSystemFinder().list([])}
+        self.assertIn('bsbmaterial/css/style.css', listed)
+        # pulled in through url() in bootstrap.css
+        self.assertIn('bsbmaterial/plugins/bootstrap/fonts/glyphicons-halflings-regular.woff', listed)
+        self.assertNotIn('bsbmaterial/plugins/bootstrap/css/bootstrap.min.css', listed)
+        self.assertFalse(os.path.exists(os.path.join(self.static_root, 'bsbmaterial/plugins/autosize')))
+
+    def test_accept_encoding_picks_the_variant(self):
+        path = os.path.join(self.static_root, self.hashed)
+        self.assertTrue(os.path.isfile(path + '.gz'))
+        with open(path + '.br', 'wb') as f:
+            f.write(b'brotli body')
+        self.addCleanup(os.remove, path + '.br')
+        with open(path, 'rb') as f:
+            plain = f.read()
+
+        response = self.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(b''.join(response.streaming_content), b'brotli body')
+
+        response = self.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+        for accept_encoding in ('', 'gzip;q=0, identity'):
+            response = self.get(f'/static/{self.hashed}', HTTP_ACCEPT_ENCODING=accept_encoding)
+            self.assertNotIn('Content-Encoding', response)
+            self.assertEqual(b''.join(response.streaming_content), plain)
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_only_hashed_names_are_immutable(self):
+        self.assertNotEqual(self.hashed, 'bsbmaterial/css/style.css')
+        self.assertEqual(self.get(f'/static/{self.hashed}')['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(self.get('/static/bsbmaterial/css/style.css')['Cache-Control'], 'public, max-age=60')
+
+    def test_paths_outside_static_root_are_not_served(self):
+        with open(os.path.join(os.path.dirname(self.static_root), 'outside.txt'), 'w') as f:
+            f.write('secret')
+        self.addCleanup(os.remove, f.name)
+        for path in ('/static/../outside.txt', '/static/%2e%2e/outside.txt', '/static//etc/passwd',
+                     '/static/bsbmaterial/../../outside.txt'):
+            self.assertEqual(self.get(path).status_code, 404, path)
+        self.assertEqual(self.get('/static/missing.css').status_code, 404)
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def sample(self, view, path='/somewhere/'):
+        return InstrumentationMiddleware(view)(RequestFactory().get(path))
+
+    def test_histogram_and_counter_output(self):
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.client.force_login(student)
+        self.client.get('/users/profile/')
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0.0):
+            # a new client, so its handler builds the middleware with this rate
+            self.client = self.client_class()
+            self.client.force_login(student)
+            self.client.get('/users/profile/')
+
+        output = registry.render()
+        labels = 'route="user-profile",method="GET",status="200"'
+        self.assertIn('# TYPE skillup_http_request_duration_seconds histogram', output)
+        self.assertIn(f'skillup_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', output)
+        self.assertIn(f'skillup_http_request_duration_seconds_count{{{labels}}} 2', output)
+        self.assertRegex(output, rf'skillup_http_request_duration_seconds_sum{{{labels}}} \d')
+        self.assertIn(f'skillup_http_response_size_bytes_bucket{{{labels},le="1000"}} 2', output)
+        # only the first request was sampled
+        self.assertIn('# TYPE skillup_http_sampled_requests_total counter', output)
+        self.assertIn('skillup_http_sampled_requests_total{route="user-profile"} 1', output)
+        self.assertIn('skillup_http_db_queries_count{route="user-profile"} 1', output)
+        buckets = re.findall(r'skillup_http_request_duration_seconds_bucket\{[^}]*\} (\d+)', output)
+        self.assertEqual([int(count) for count in buckets], sorted(int(count) for count in buckets))
+
+    def test_sampled_request_counts_queries_and_cache_lookups(self):
+        def view(request):
+            User.objects.count()
+            User.objects.exists()
+            cache = caches['default']
+            cache.get('instrumentation-test')
+            cache.set('instrumentation-test', 1)
+            cache.get('instrumentation-test')
+            cache.get_many(['instrumentation-test', 'instrumentation-other'])
+            return JsonResponse({})
+
+        self.sample(view)
+        output = registry.render()
+        route = 'route="<unresolved>"'
+        self.assertIn(f'skillup_http_db_queries_bucket{{{route},le="1"}} 0', output)
+        self.assertIn(f'skillup_http_db_queries_bucket{{{route},le="2"}} 1', output)
+        self.assertIn(f'skillup_http_db_queries_sum{{{route}}} 2', output)
+        self.assertIn(f'skillup_http_cache_requests_total{{{route},cache="default",result="hit"}} 2', output)
+        self.assertIn(f'skillup_http_cache_requests_total{{{route},cache="default",result="miss"}} 2', output)
+        self.assertNotIn('cache="markdown"', output)
+
+        # lookups outside a sampled request are not counted
+        caches['default'].get('instrumentation-test')
+        self.assertEqual(registry.render(), output)
+
+    def test_slow_request_is_logged_with_its_sql(self):
+        def view(request):
+            list(User.objects.filter(knox_id='slow'))
+            return JsonResponse({})
+
+        with self.assertNoLogs('skillup.slow_requests'):
+            self.sample(view)
+        with override_settings(INSTRUMENTATION_SLOW_REQUEST_SECONDS=0), \
+                self.assertLogs('skillup.slow_requests', 'WARNING') as logs:
+            self.sample(view, '/slow/?page=2')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Slow request GET /slow/?page=2 (<unresolved>)', logs.output[0])
+        self.assertIn('1 queries', logs.output[0])
+        self.assertIn('FROM "skillup_user"', logs.output[0])
+        self.assertIn('skillup_http_slow_requests_total{route="<unresolved>"} 1', registry.render())
+
+    def test_metrics_view_access(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.client.force_login(student)
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+
+        staff = User.objects.create_user('staff', 'staff@example.com', 'password123', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer scrape-secret').status_code,
+                             200)
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the summary tables are kept by SQLite triggers')
+class TaskStatTriggerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cot = User.objects.create_user('cot', 'cot@example.com', department='COT', lab_part='CO1', password='password123')
+        cls.cst = User.objects.create_user('cst', 'cst@example.com', department='CST', lab_part='CO2', password='password123')
+
+    def snapshot(self):
+        stats = TaskStat.objects.filter(task_count__gt=0).values_list(
+            'department', 'lab_part', 'status', 'review_status', 'task_count', 'timed_count', 'time_taken_sum'
+        )
+        buckets = TaskTimeBucket.objects.filter(task_count__gt=0).values_list(
+            'department', 'lab_part', 'bucket', 'task_count'
+        )
+        return set(stats), set(buckets)
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        stats.rebuild()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_task_writes(self):
+        task = Task.objects.create(title='one', assigned_to=self.cot)
+        Task.objects.bulk_create(synthetic.iter_tasks(random.Random(9), 50, [self.cot.pk, self.cst.pk], [],
+                                                      timezone.now()))
+        task.status, task.time_taken = 'submitted', 150
+        task.save()
+        Task.objects.filter(status='assigned').update(status='failed')
+        Task.objects.filter(pk=task.pk).update(assigned_to=self.cst)
+        Task.objects.filter(status='done', review_status='failed').delete()
+        self.assertMatchesRebuild()
+
+    def test_department_change_moves_existing_tasks(self):
+        task = Task.objects.create(title='one', assigned_to=self.cot, status='ongoing')
+        self.cot.department = 'CST'
+        self.cot.save()
+        Task.objects.filter(pk=task.pk).update(status='submitted', time_taken=90)
+        self.assertFalse(TaskStat.objects.filter(department='COT', task_count__gt=0).exists())
+        self.assertEqual(TaskStat.objects.get(department='CST', lab_part='CO1', status='submitted').task_count, 1)
+        self.assertMatchesRebuild()
+
+    def test_bulk_profile_update(self):
+        Task.objects.bulk_create(synthetic.iter_tasks(random.Random(10), 40, [self.cot.pk, self.cst.pk], [],
+                                                      timezone.now()))
+        User.objects.filter(pk__in=[self.cot.pk, self.cst.pk]).update(lab_part=None)
+        User.objects.filter(pk=self.cst.pk).update(department='NWT', lab_part='CML')
+        self.assertMatchesRebuild()
+
+    def test_migration_rebuild_sql_matches_rebuild(self):
+        Task.objects.bulk_create(synthetic.iter_tasks(random.Random(11), 40, [self.cot.pk, self.cst.pk], [],
+                                                      timezone.now()))
+        stats.rebuild()
+        expected = self.snapshot()
+        migration = import_module('skillup.migrations.0011_task_stats_user_group_trigger')
+        with connection.cursor() as cursor:
+            for sql in migration.REBUILD:
+                cursor.execute(sql)
+            self.assertEqual(self.snapshot(), expected)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'skillup_taskstat_%'")
+            self.assertEqual({row[0] for row in cursor.fetchall()}, {
+                'skillup_taskstat_insert', 'skillup_taskstat_delete', 'skillup_taskstat_update',
+                'skillup_taskstat_user_group',
+            })
+
+
+class UserImportTests(TestCase):
+    def test_clean_row(self):
+        row = clean_row({'knox_id': ' student ', 'email': 'student@example.com', 'department': 'COT',
+                         'lab_part': '', 'project': None, 'password': 'secret123'})
+        self.assertEqual(row, {'knox_id': 'student', 'email': 'student@example.com', 'department': 'COT',
+                               'lab_part': None, 'project': None, 'password': 'secret123'})
+        for bad in ({'knox_id': ''}, {'knox_id': 'x' * 51}, {'knox_id': 'a', 'email': 'not-an-email'},
+                    {'knox_id': 'a', 'department': 'XXX'}, {'knox_id': 'a', 'lab_part': 'XXX'},
+                    {'__error__': 'invalid JSON'}):
+            with self.subTest(row=bad), self.assertRaises(ValidationError):
+                clean_row(bad)
+
+    def test_upsert(self):
+        User.objects.create_user('kept', 'kept@example.com', 'original-password', department='COT')
+        User.objects.create_user('changed', 'changed@example.com', 'original-password')
+        rows = read_rows(io.StringIO(
+            'knox_id,email,department,lab_part,project,password\n'
+            'kept,kept@example.com,CST,CO1,,\n'
+            'changed,changed@example.com,,,,new-password\n'
+            'new,new@example.com,NWT,,,\n'
+            'bad,,XXX,,,\n'
+        ), 'csv')
+        errors = []
+        report = import_users(rows, update_passwords=True, on_error=lambda line, message: errors.append(line))
+        self.assertEqual(report, {'created': 1, 'updated': 2, 'invalid': 1})
+        self.assertEqual(errors, [5])
+
+        kept = User.objects.get(knox_id='kept')
+        self.assertEqual((kept.department, kept.lab_part), ('CST', 'CO1'))
+        self.assertTrue(kept.check_password('original-password'))
+        self.assertTrue(User.objects.get(knox_id='changed').check_password('new-password'))
+        self.assertFalse(User.objects.get(knox_id='new').has_usable_password())
+
+    def test_existing_passwords_kept_without_update_passwords(self):
+        User.objects.create_user('student', 'student@example.com', 'original-password')
+        import_users([(2, {'knox_id': 'student', 'password': 'new-password'})])
+        self.assertTrue(User.objects.get(knox_id='student').check_password('original-password'))
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        cls.tasks = [Task.objects.create(title=f'task {number}', assigned_to=cls.student) for number in range(2)]
+
+    def setUp(self):
+        self.headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.student)['access']}"}
+
+    def test_task_list_revalidates_by_etag_only(self):
+        response = self.client.get('/api/tasks/', **self.headers)
+        self.assertNotIn('Last-Modified', response.headers)
+        etag = response.headers['ETag']
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag, **self.headers).status_code, 304)
+
+        self.tasks[0].delete()
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_IF_NONE_MATCH=etag, **self.headers).status_code, 200)
+        future = http_date(time.time() + 3600)
+        self.assertEqual(self.client.get('/api/tasks/', HTTP_IF_MODIFIED_SINCE=future, **self.headers).status_code,
+                         200)
+
+    def test_task_retrieve_changes_with_assignee_profile(self):
+        path = f'/api/tasks/{self.tasks[1].pk}/'
+        response = self.client.get(path, **self.headers)
+        self.assertNotIn('Last-Modified', response.headers)
+        etag = response.headers['ETag']
+        self.student.department = 'CST'
+        self.student.save()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['assigned_to']['department'], 'CST')
+
+
+class BulkAssignTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        cls.cot = [User.objects.create_user(f'cot-{number}', f'cot-{number}@example.com', 'password123',
+                                            department='COT', lab_part='CO1') for number in range(3)]
+        cls.cst = User.objects.create_user('cst', 'cst@example.com', 'password123', department='CST', lab_part='CO1')
+        User.objects.create_user('gone', 'gone@example.com', 'password123', department='COT', is_active=False)
+        original = MarkdownFile(title='Guide', file=ContentFile(b'# Guide\n', name='guide.md'))
+        original.save()
+        modified = ModifiedMarkdownFile(original_file=original, modified_by=cls.admin,
+                                        modified_file=ContentFile(b'# Guide\nmore\n', name='modified.md'))
+        modified.save()
+        cls.submitted = SubmittedMarkdownFile.objects.create(modified_file=modified)
+
+    def assigned(self):
+        return set(Task.objects.filter(submitted_file=self.submitted).values_list('assigned_to__knox_id', flat=True))
+
+    def test_selectors_match_active_users(self):
+        result = bulk_assign(self.submitted, department='COT', time_limit_minutes=45)
+        self.assertEqual(result, {'matched': 3, 'created': 3, 'skipped': 0, 'unmatched_knox_ids': []})
+        self.assertEqual(self.assigned(), {'cot-0', 'cot-1', 'cot-2'})
+        task = Task.objects.filter(submitted_file=self.submitted).first()
+        self.assertEqual((task.title, task.time_limit_minutes), ('Guide', 45))
+
+        bulk_assign(self.submitted, lab_part='CO1', knox_ids=['cst'], title='Custom')
+        self.assertEqual(Task.objects.get(assigned_to=self.cst).title, 'Custom')
+
+    def test_users_with_the_task_are_skipped(self):
+        bulk_assign(self.submitted, knox_ids=['cot-0'])
+        result = bulk_assign(self.submitted, lab_part='CO1')
+        self.assertEqual((result['matched'], result['created'], result['skipped']), (4, 3, 1))
+        self.assertEqual(Task.objects.filter(submitted_file=self.submitted, assigned_to=self.cot[0]).count(), 1)
+
+    def test_unmatched_knox_ids_are_reported(self):
+        result = bulk_assign(self.submitted, knox_ids=['cot-1', 'gone', 'nobody'])
+        self.assertEqual(result['unmatched_knox_ids'], ['gone', 'nobody'])
+        self.assertEqual(self.assigned(), {'cot-1'})
+
+    def test_api_is_staff_only(self):
+        payload = {'submitted_file': self.submitted.pk, 'department': 'COT'}
+        student = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.cot[0])['access']}"}
+        response = self.client.post('/api/tasks/bulk-assign/', payload, content_type='application/json', **student)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.assigned(), set())
+
+        admin = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.admin)['access']}"}
+        response = self.client.post('/api/tasks/bulk-assign/', payload, content_type='application/json', **admin)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+
+        response = self.client.post('/api/tasks/bulk-assign/', {'submitted_file': self.submitted.pk},
+                                    content_type='application/json', **admin)
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_form(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:submittedmarkdownfile_bulk_assign', args=[self.submitted.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="knox_ids"')
+
+        response = self.client.post(url, {'knox_ids': 'cot-0, cot-2\nnobody', 'time_limit_minutes': 30}, follow=True)
+        self.assertRedirects(response, reverse('admin:skillup_task_changelist'))
+        self.assertEqual(self.assigned(), {'cot-0', 'cot-2'})
+        messages = [str(message) for message in response.context['messages']]
+        self.assertIn('2 tasks created, 0 students already had this task', messages)
+        self.assertIn('No active user for: nobody', messages)
+
+        response = self.client.post(url, {'time_limit_minutes': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Select users by department')
+
+
+class ReviewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        cls.done = [Task.objects.create(title=f'done {number}', assigned_to=cls.student, status='done')
+                    for number in range(2)]
+        cls.ongoing = Task.objects.create(title='ongoing', assigned_to=cls.student, status='ongoing')
+
+    def review_status(self, task):
+        return Task.objects.values_list('review_status', flat=True).get(pk=task.pk)
+
+    def test_results_per_id_from_one_update(self):
+        missing = self.ongoing.pk + 100
+        with CaptureQueriesContext(connection) as queries:
+            results = review_tasks([self.done[0].pk, self.done[1].pk, self.ongoing.pk, missing, missing], 'passed')
+        self.assertEqual(results, {self.done[0].pk: 'updated', self.done[1].pk: 'updated',
+                                   self.ongoing.pk: 'not_done', missing: 'not_found'})
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "skillup_task"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual([self.review_status(task) for task in self.done], ['passed', 'passed'])
+        self.assertEqual(self.review_status(self.ongoing), 'pending')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(review_tasks([self.ongoing.pk], 'failed'), {self.ongoing.pk: 'not_done'})
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE')])
+        with self.assertRaises(ValueError):
+            review_tasks([self.done[0].pk], 'pending')
+
+    def test_api_is_staff_only(self):
+        payload = {'ids': [self.done[0].pk, self.ongoing.pk], 'review_status': 'failed'}
+        student = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.student)['access']}"}
+        response = self.client.post('/api/tasks/review/', payload, content_type='application/json', **student)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.review_status(self.done[0]), 'pending')
+
+        admin = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.admin)['access']}"}
+        response = self.client.post('/api/tasks/review/', payload, content_type='application/json', **admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'],
+                         {str(self.done[0].pk): 'updated', str(self.ongoing.pk): 'not_done'})
+        self.assertEqual(self.review_status(self.done[0]), 'failed')
+
+        response = self.client.post('/api/tasks/review/', {**payload, 'review_status': 'pending'},
+                                    content_type='application/json', **admin)
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_actions(self):
+        changelist = reverse('admin:skillup_task_changelist')
+        action = {'action': 'mark_selected_pass', '_selected_action': [self.done[0].pk, self.ongoing.pk]}
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.post(changelist, action).status_code, 302)
+        self.assertEqual(self.review_status(self.done[0]), 'pending')
+
+        self.client.force_login(self.admin)
+        response = self.client.post(changelist, action, follow=True)
+        messages = [str(message) for message in response.context['messages']]
+        self.assertEqual(messages, ['1 tasks marked as PASSED', '1 selected tasks are not done and were skipped'])
+        self.assertEqual(self.review_status(self.done[0]), 'passed')
+        self.assertEqual(self.review_status(self.ongoing), 'pending')
+
+        response = self.client.get(reverse('admin:task_mark_fail', args=[self.done[1].pk]))
+        self.assertRedirects(response, changelist)
+        self.assertEqual(self.review_status(self.done[1]), 'failed')
+
+
+class TaskPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'password123', is_staff=True)
+        student = User.objects.create_user('student', 'student@example.com', 'password123')
+        Task.objects.bulk_create(Task(title=f'task {number}', assigned_to=student) for number in range(7))
+        # one bulk_assign: every task shares the same created_at
+        Task.objects.update(created_at=timezone.now())
+        cls.ids = list(Task.objects.order_by('id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.staff)['access']}"}
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                body = self.client.get(url, **self.headers).json()
+            page_sql = [query['sql'] for query in queries if 'ORDER BY' in query['sql']]
+            self.assertEqual(len(page_sql), 1)
+            self.assertNotIn('OFFSET', page_sql[0])
+            pages.append([task['id'] for task in body['results']])
+            url = body[link]
+        return pages
+
+    def test_tied_created_at_is_paged_by_id(self):
+        pages = self.walk('/api/tasks/?page_size=2', 'next')
+        self.assertEqual(pages, [self.ids[0:2], self.ids[2:4], self.ids[4:6], self.ids[6:7]])
+
+        url = self.client.get('/api/tasks/?page_size=2', **self.headers).json()['next']
+        for _ in range(2):
+            url = self.client.get(url, **self.headers).json()['next']
+        back = self.walk(url, 'previous')
+        self.assertEqual(back, [self.ids[6:7], self.ids[4:6], self.ids[2:4], self.ids[0:2]])
+
+    def test_malformed_cursor_is_not_found(self):
+        response = self.client.get('/api/tasks/?cursor=cD1ub3QtYS1kYXRl', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class HybridLoginTests(TestCase):
+    def login(self, knox_id, password):
+        return self.client.post('/hybrid-login/', {'knox_id': knox_id, 'password': password},
+                                content_type='application/json')
+
+    def test_outdated_hash_is_upgraded(self):
+        outdated = PBKDF2PasswordHasher().encode('password123', 'outdatedsalt', iterations=1000)
+        User.objects.create_user('student', 'student@example.com', hashed_password=outdated)
+        self.assertEqual(self.login('student', 'password123').status_code, 200)
+        user = User.objects.get(knox_id='student')
+        self.assertNotEqual(user.password, outdated)
+        self.assertFalse(get_hasher().must_update(user.password))
+        self.assertTrue(user.check_password('password123'))
+
+    def test_failed_logins_send_user_login_failed(self):
+        User.objects.create_user('student', 'student@example.com', 'password123')
+        failures = []
+
+        def receiver(sender, credentials, request, **kwargs):
+            failures.append(credentials)
+
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        self.assertEqual(self.login('student', 'wrong-password').status_code, 401)
+        self.assertEqual(self.login('nobody', 'password123').status_code, 401)
+        self.assertEqual(failures, [{'knox_id': 'student'}, {'knox_id': 'nobody'}])
+
+
+class BlobStorageTests(MediaTestCase):
+    def test_reused_blob_survives_gc_until_its_row_commits(self):
+        storage = markdown_storage()
+        guide = MarkdownFile(title='Guide', file=ContentFile(b'# Guide\n', name='guide.md'))
+        guide.save()
+        name = guide.file.name
+        guide.delete()
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 0)
+        an_hour_ago = time.time() - 2 * 3600
+        os.utime(storage.path(name), (an_hour_ago, an_hour_ago))
+
+        # the same content uploaded again, its row not committed yet
+        self.assertEqual(storage.save('again.md', ContentFile(b'# Guide\n')), name)
+        call_command('gc_blobs', grace_minutes=60, stdout=io.StringIO())
+        self.assertTrue(storage.exists(name))
+
+        os.utime(storage.path(name), (an_hour_ago, an_hour_ago))
+        call_command('gc_blobs', grace_minutes=60, stdout=io.StringIO())
+        self.assertFalse(storage.exists(name))
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the search index is an SQLite FTS5 table')
+class SearchTests(MediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password123')
+
+    def create_guide(self, title, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            guide = MarkdownFile(title=title, file=ContentFile(content.encode(), name='guide.md'))
+            guide.save()
+        return guide
+
+    def result_ids(self, text, kind=None):
+        return [(result['kind'], result['id']) for result in search.search(text, kind=kind)]
+
+    def test_to_match_query_quotes_fts_syntax(self):
+        self.assertEqual(search.to_match_query('kubectl apply'), '"kubectl" "apply"*')
+        self.assertEqual(search.to_match_query('say "hi" OR title:x NEAR(a b)'),
+                         '"say" """hi""" "OR" "title:x" "NEAR(a" "b)"*')
+        self.assertEqual(search.to_match_query('   '), '')
+        # would be a syntax error unquoted
+        self.assertEqual(search.search('"unbalanced AND ( title:'), [])
+
+    def test_signals_index_and_unindex(self):
+        guide = self.create_guide('Cluster setup', '# Deploy\n\nRun the ingress controller.\n')
+        original = search.KINDS[MarkdownFile]
+        self.assertEqual(self.result_ids('ingress'), [(original, guide.pk)])
+        with self.captureOnCommitCallbacks(execute=True):
+            modified = ModifiedMarkdownFile(original_file=guide, modified_by=self.admin,
+                                            modified_file=ContentFile(b'# Deploy\n\nRun the gateway.\n', name='m.md'))
+            modified.save()
+        self.assertEqual(self.result_ids('gateway'), [(search.KINDS[ModifiedMarkdownFile], modified.pk)])
+        self.assertEqual(self.result_ids('admin'), [(search.KINDS[ModifiedMarkdownFile], modified.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            guide.file = ContentFile(b'# Deploy\n\nRun the load balancer.\n', name='guide.md')
+            guide.save()
+        self.assertEqual(self.result_ids('ingress', kind=original), [])
+        self.assertEqual(self.result_ids('balancer', kind=original), [(original, guide.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            guide.delete()
+        self.assertEqual(self.result_ids('balancer'), [])
+        self.assertEqual(self.result_ids('gateway'), [])
+
+    def test_retitle_reaches_modifications(self):
+        guide = self.create_guide('Cluster setup', '# Deploy\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            modified = ModifiedMarkdownFile(original_file=guide, modified_by=self.admin,
+                                            modified_file=ContentFile(b'# Changed\n', name='m.md'))
+            modified.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            guide.title = 'Storage migration'
+            guide.save()
+        kind = search.KINDS[ModifiedMarkdownFile]
+        self.assertEqual(self.result_ids('migration', kind=kind), [(kind, modified.pk)])
+        self.assertEqual(self.result_ids('cluster', kind=kind), [])
+
+    def test_admin_search_is_not_capped(self):
+        guide = self.create_guide('Guide', '# Deploy\n')
+        guides = MarkdownFile.objects.bulk_create(
+            MarkdownFile(title=f'Widget guide {number}', file=guide.file.name) for number in range(1200)
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(f'INSERT INTO {search.TABLE} (rowid, title, author, body) VALUES (%s, %s, %s, %s)',
+                               [(row.pk * 2, row.title, '', 'widget') for row in guides])
+        self.client.force_login(self.admin)
+        response = self.client.get('/admin/skillup/markdownfile/?q=widget')
+        self.assertEqual(response.context['cl'].result_count, 1200)
+        self.assertEqual(search.filter_matching(MarkdownFile.objects.all(), 'widget').count(), 1200)
+
+
+class ReadReplicaTests(TransactionTestCase):
+    """ReadReplicaRouter against a second SQLite file that lags the primary by one task.
+
+    The replica alias is added after the test runner has set up its
+    databases, so it is a plain file rather than a test mirror.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        middleware = ['core.routers.ReadReplicaMiddleware', *settings.MIDDLEWARE]
+        cls.enterClassContext(override_settings(DATABASE_ROUTERS=['core.routers.ReadReplicaRouter'],
+                                                MIDDLEWARE=middleware))
+        directory = cls.enterClassContext(TemporaryDirectory())
+        super().setUpClass()
+        cls.replica_name = os.path.join(directory, 'replica.sqlite3')
+        # configure_settings fills in the defaults, but only for a dict that has a 'default'
+        connections.settings[REPLICA_DB_ALIAS] = connections.configure_settings({
+            'default': {},
+            REPLICA_DB_ALIAS: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_name},
+        })[REPLICA_DB_ALIAS]
+        cls.databases = cls.databases | {REPLICA_DB_ALIAS}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        super().tearDownClass()
+
+    def setUp(self):
+        self.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        self.replicated = Task.objects.create(title='replicated', assigned_to=self.student)
+        connections[REPLICA_DB_ALIAS].close()
+        connections['default'].ensure_connection()
+        with closing(sqlite3.connect(self.replica_name)) as replica:
+            connections['default'].connection.backup(replica)
+        # written after the copy, so only the primary has it
+        Task.objects.create(title='not replicated yet', assigned_to=self.student)
+        self.headers = {'HTTP_AUTHORIZATION': f"Bearer {issue_tokens(self.student)['access']}"}
+
+    def task_titles(self):
+        response = self.client.get('/api/tasks/', **self.headers)
+        return sorted(task['title'] for task in response.json()['results'])
+
+    def test_get_reads_from_the_replica(self):
+        self.assertEqual(self.task_titles(), ['replicated'])
+
+    def test_write_pins_reads_to_the_primary(self):
+        response = self.client.post(f'/api/tasks/{self.replicated.pk}/start/', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        # the sticky cookie keeps the next GET on the primary
+        self.assertEqual(self.task_titles(), ['not replicated yet', 'replicated'])
+        self.client.cookies.pop(STICKY_COOKIE)
+        self.assertEqual(self.task_titles(), ['replicated'])
+
+    def test_read_after_write_in_the_same_request(self):
+        def view(request):
+            before = Task.objects.count()
+            Task.objects.create(title='written', assigned_to=self.student)
+            return JsonResponse({'before': before, 'after': Task.objects.count()})
+
+        response = ReadReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(json.loads(response.content), {'before': 1, 'after': 3})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+
+class TaskTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create_user('student', 'student@example.com', 'password123')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'password123')
+
+    def post(self, user, task, action, data=None):
+        return self.client.post(f'/api/tasks/{task.pk}/{action}/', data, content_type='application/json',
+                                HTTP_AUTHORIZATION=f"Bearer {issue_tokens(user)['access']}")
+
+    def test_rejected_transition_costs_one_query(self):
+        task = Task.objects.create(title='task', assigned_to=self.student)
+        with self.assertNumQueries(1):
+            response = self.post(self.student, task, 'complete')
+        self.assertEqual(response.status_code, 403)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'assigned')
+
+    def test_other_students_cannot_move_a_task(self):
+        task = Task.objects.create(title='task', assigned_to=self.student)
+        for action in ('start', 'submit', 'complete', 'fail'):
+            with self.subTest(action=action):
+                self.assertEqual(self.post(self.other, task, action).status_code, 403)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.started_at), ('assigned', None))
+
+    def test_start_sets_started_at_and_deadline_once(self):
+        task = Task.objects.create(title='task', assigned_to=self.student, time_limit_minutes=45)
+        self.assertEqual(self.post(self.student, task, 'start').json()['status'], 'ongoing')
+        task.refresh_from_db()
+        self.assertEqual(task.deadline, task.started_at + timedelta(minutes=45))
+        started_at, deadline = task.started_at, task.deadline
+
+        self.assertEqual(self.post(self.student, task, 'submit', {'time_taken': 120}).status_code, 200)
+        self.assertEqual(self.post(self.student, task, 'start').status_code, 200)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.started_at, task.deadline, task.time_taken),
+                         ('ongoing', started_at, deadline, 120))
+
+    def test_expire_overdue(self):
+        now = timezone.now()
+        overdue = Task.objects.create(title='overdue', assigned_to=self.student, status='ongoing',
+                                      deadline=now - timedelta(minutes=1))
+        current = Task.objects.create(title='current', assigned_to=self.student, status='ongoing',
+                                      deadline=now + timedelta(minutes=1))
+        self.assertEqual(sum(expire_overdue(batch_size=1, now=now)), 1)
+        self.assertEqual(Task.objects.get(pk=overdue.pk).status, 'failed')
+        self.assertEqual(Task.objects.get(pk=current.pk).status, 'ongoing')
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# copied into access tokens so stateless endpoints never need the user row;
+# refresh tokens carry none of them, every refresh reads them again
+PROFILE_CLAIMS = ('knox_id', 'email', 'department', 'lab_part', 'project')
+
+
+def stamp_claims(access, user):
+    access['is_staff'] = user.is_staff
+    for claim in PROFILE_CLAIMS:
+        access[claim] = getattr(user, claim)
+    return access
+
+
+def issue_tokens(user):
+    refresh = RefreshToken.for_user(user)
+    return {'refresh': str(refresh), 'access': str(stamp_claims(refresh.access_token, user))}
+
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    """Re-reads the user, so a demotion or profile change reaches the next access token."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user = get_user_model().objects.filter(pk=refresh.payload.get(api_settings.USER_ID_CLAIM)).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        data = super().validate(attrs)
+        data['access'] = str(stamp_claims(AccessToken(data['access']), user))
+        return data
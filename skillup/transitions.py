@@ -0,0 +1,61 @@
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .expressions import deadline_from
+from .models import Task
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+# action -> (statuses it may start from, status it leads to)
+TRANSITIONS = {
+    'start': (('assigned', 'submitted'), 'ongoing'),
+    'submit': (('assigned', 'ongoing', 'submitted'), 'submitted'),
+    'complete': (('ongoing', 'submitted'), 'done'),
+    'fail': (('assigned', 'ongoing', 'submitted'), 'failed'),
+    'expire': (('ongoing',), 'failed'),
+}
+
+
+def transition(task_id, action, assigned_to=None, **values):
+    """Apply action to a task with one conditional UPDATE and return the columns it wrote.
+
+    The current status is checked in the WHERE clause, so concurrent clicks
+    cannot both succeed and a rejected transition costs no extra query.
+    Only status, updated_at and the extra values are written.
+    """
+    from_statuses, to_status = TRANSITIONS[action]
+    now = timezone.now()
+    state = {'status': to_status, 'updated_at': now, **values}
+
+    changes = dict(state)
+    if action == 'start':
+        now_value = Value(now, output_field=DateTimeField())
+        changes['started_at'] = Coalesce(F('started_at'), now_value)
+        changes['deadline'] = Coalesce(F('deadline'), deadline_from(now_value))
+
+    tasks = Task.objects.filter(pk=task_id, status__in=from_statuses)
+    if assigned_to is not None:
+        tasks = tasks.filter(assigned_to=assigned_to)
+    if not tasks.update(**changes):
+        raise InvalidTransition(f'cannot {action} task {task_id}')
+    return state
+
+
+def expire_overdue(batch_size=1000, now=None):
+    """Fail ongoing tasks whose deadline has passed, batch_size rows per UPDATE.
+
+    Every batch commits on its own, so the write lock is only held for one
+    short UPDATE at a time. Yields the number of tasks failed per batch.
+    """
+    _, to_status = TRANSITIONS['expire']
+    now = now or timezone.now()
+    overdue = Task.objects.filter(status='ongoing', deadline__lt=now)
+    while True:
+        batch = list(overdue.order_by('deadline').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield overdue.filter(pk__in=batch).update(status=to_status, updated_at=timezone.now())
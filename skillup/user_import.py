@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import hashing
+from .backends import bump_users_version, forget_users
+from .models import User
+
+FIELDS = ('knox_id', 'email', 'department', 'lab_part', 'project', 'password')
+PROFILE_FIELDS = ['email', 'department', 'lab_part', 'project']
+DEPARTMENTS = {choice for choice, _ in User.DEPARTMENT_CHOICES}
+LAB_PARTS = {choice for choice, _ in User.LAB_PART_CHOICES}
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a CSV or JSONL text stream, one line at a time."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_no, {'__error__': f'invalid JSON: {exc}'}
+                continue
+            yield line_no, row if isinstance(row, dict) else {'__error__': 'expected a JSON object'}
+    else:
+        raise ValueError(f'unsupported format {fmt!r}')
+
+
+def text_stream(binary_file):
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def clean_row(row):
+    if '__error__' in row:
+        raise ValidationError(row['__error__'])
+    cleaned = {field: (str(row.get(field) or '')).strip() for field in FIELDS}
+    if not cleaned['knox_id']:
+        raise ValidationError('knox_id is required')
+    if len(cleaned['knox_id']) > 50:
+        raise ValidationError('knox_id is longer than 50 characters')
+    if cleaned['email']:
+        validate_email(cleaned['email'])
+    if cleaned['department'] and cleaned['department'] not in DEPARTMENTS:
+        raise ValidationError(f"unknown department {cleaned['department']!r}")
+    if cleaned['lab_part'] and cleaned['lab_part'] not in LAB_PARTS:
+        raise ValidationError(f"unknown lab_part {cleaned['lab_part']!r}")
+    for field in ('department', 'lab_part', 'project'):
+        cleaned[field] = cleaned[field] or None
+    return cleaned
+
+
+def _import_chunk(rows, update_passwords):
+    # last row wins if a knox_id repeats inside the chunk
+    rows = {row['knox_id']: row for row in rows}
+    existing = dict(User.objects.filter(knox_id__in=rows.keys()).values_list('knox_id', 'pk'))
+
+    to_hash = [knox_id for knox_id, row in rows.items()
+               if row['password'] and (update_passwords or knox_id not in existing)]
+    hashed = dict(zip(to_hash, hashing.hash_passwords([rows[knox_id]['password'] for knox_id in to_hash])))
+
+    # separate upserts: rows without a password must never overwrite an existing one
+    with_password, without_password = [], []
+    for knox_id, row in rows.items():
+        user = User(knox_id=knox_id, is_active=True, **{field: row[field] for field in PROFILE_FIELDS})
+        if knox_id in hashed:
+            user.password = hashed[knox_id]
+            with_password.append(user)
+        else:
+            # only stored for new users
+            user.set_unusable_password()
+            without_password.append(user)
+
+    with transaction.atomic():
+        for users, update_fields in (
+            (with_password, PROFILE_FIELDS + (['password'] if update_passwords else [])),
+            (without_password, PROFILE_FIELDS),
+        ):
+            if users:
+                User.objects.bulk_create(users, update_conflicts=True, unique_fields=['knox_id'],
+                                         update_fields=update_fields)
+    if existing:
+        forget_users(existing.values())
+        bump_users_version()
+    return len(rows) - len(existing), len(existing)
+
+
+def import_users(numbered_rows, chunk_size=1000, update_passwords=False, on_error=None):
+    """Upsert users from (line number, row) pairs, chunk_size rows per INSERT.
+
+    Only one chunk is held in memory. New users' passwords are hashed in the
+    hashing pool; existing users keep theirs unless update_passwords is set.
+    on_error(line_no, message) is called for every rejected row.
+    """
+    report = {'created': 0, 'updated': 0, 'invalid': 0}
+
+    def flush(chunk):
+        created, updated = _import_chunk(chunk, update_passwords)
+        report['created'] += created
+        report['updated'] += updated
+
+    chunk = []
+    for line_no, row in numbered_rows:
+        try:
+            chunk.append(clean_row(row))
+        except ValidationError as exc:
+            report['invalid'] += 1
+            if on_error:
+                on_error(line_no, '; '.join(exc.messages))
+            continue
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return report
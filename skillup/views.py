@@ -1,22 +1,35 @@
-import markdown  # type: ignore
-
-from django.contrib.auth import get_user_model, login, authenticate
+from django.contrib.auth import get_user_model, login
+from django.contrib.auth.signals import user_login_failed
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseBadRequest
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db.models import Count, Max
+from django.utils.functional import lazy
 
 from rest_framework.permissions import BasePermission, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.views import APIView
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import authentication_classes
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
 
 from rest_framework import permissions, viewsets, status, mixins
 
+from . import conditional, deltas, markdown_cache, markdown_sections, search, stats
+from .assignment import bulk_assign
+from .backends import users_version
+from .hashing import hash_password, verify_password, HashingPoolBusy
+from .review import review_tasks
+from .tokens import issue_tokens
+from .transitions import transition, InvalidTransition
 from .models import Task, MarkdownFile, ModifiedMarkdownFile, SubmittedMarkdownFile
+from .pagination import TaskCursorPagination
 from .serializers import (
-    TaskSerializer, UserRegistrationSerializer,
+    TaskSerializer, UserRegistrationSerializer, BulkAssignSerializer, BatchReviewSerializer,
     MarkdownFileSerializer, ModifiedMarkdownFileSerializer, SubmittedMarkdownFileSerializer
 )
 
@@ -28,17 +41,41 @@ class HybridLoginView(APIView):
     authentication_classes = []
     permission_classes = []
 
+    @staticmethod
+    def check_credentials(knox_id, password):
+        # same checks as ModelBackend, with the hash checked in the hashing pool
+        user = User.objects.filter(knox_id=knox_id).first()
+        if user is None:
+            # spend the same time as a wrong password so unknown ids don't stand out
+            hash_password(password)
+            return None
+
+        def upgrade(raw_password):
+            # re-hashed with the current hasher and work factor, as User.check_password does
+            user.password = hash_password(raw_password)
+            user.save(update_fields=['password'])
+
+        if not verify_password(password, user.password, setter=upgrade) or not user.is_active:
+            return None
+        return user
+
     def post(self, request, *args, **kwargs):
         knox_id = request.data.get('knox_id')
         password = request.data.get('password')
         if not knox_id or not password:
             return Response({'detail': 'knox_id and password required'}, status=status.HTTP_400_BAD_REQUEST)
-        user = authenticate(request, knox_id=knox_id, password=password)
+        try:
+            user = self.check_credentials(knox_id, password)
+        except HashingPoolBusy:
+            return Response({'detail': 'Too many logins in progress, retry shortly'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
         if user is None:
+            # what authenticate() would send, for lockout and audit receivers
+            user_login_failed.send(sender=__name__, credentials={'knox_id': knox_id}, request=request)
             return Response({'detail': 'Invalid Knox ID or Password'}, status=status.HTTP_401_UNAUTHORIZED)
-        login(request, user, backend='django.contrib.auth.backends.ModelBackend')
-        # simple session auth response
-        return Response({'detail': 'Hybrid login successful'}, status=status.HTTP_200_OK)
+        login(request, user, backend='skillup.backends.CachedModelBackend')
+        # session for the pages, tokens for API clients
+        return Response({'detail': 'Hybrid login successful', **issue_tokens(user)}, status=status.HTTP_200_OK)
 
 
 def login_view(request):
@@ -60,22 +97,91 @@ def task_view(request, task_id):
 
 @login_required
 def task_detail_view(request, pk):
-    task = get_object_or_404(Task, id=pk, assigned_to=request.user)
+    task = get_object_or_404(
+        Task.objects.select_related('submitted_file__modified_file'),
+        id=pk, assigned_to=request.user
+    )
     is_review = request.GET.get('review') == 'true'
-    raw_markdown = task.get_markdown_content() or ""
-    render_md = markdown.markdown(raw_markdown)
     if is_review and task.status != 'done':
         return HttpResponseBadRequest("Cannot review a task that isn't done")
-    return render(request, 'task_detail.html', {
+    markdown_file = task.get_markdown_file()
+    etag = conditional.make_etag(
+        'task-detail', task.pk, task.updated_at, task.status, is_review,
+        markdown_file.content_hash if markdown_file else '', getattr(staticfiles_storage, 'manifest_hash', ''),
+    )
+    response = conditional.not_modified(request, etag)
+    if response is not None:
+        return response
+    response = render(request, 'task_detail.html', {
         'task': task,
-        'task_markdown': raw_markdown,
-        'render_markdown': render_md,
+        # only read or rendered when the cached fragment has to be rebuilt
+        'task_markdown': lazy(task.get_markdown_content, str)(),
+        'render_markdown': lazy(markdown_cache.render_task_markdown, str)(task),
         'time_limit': task.time_limit_minutes,
         'is_review': is_review
     })
+    return conditional.set_validators(response, etag)
+
+
+def _task_markdown_file(request, pk):
+    task = get_object_or_404(
+        Task.objects.select_related('submitted_file__modified_file'),
+        id=pk, assigned_to=request.user
+    )
+    markdown_file = task.get_markdown_file()
+    if markdown_file is None or not markdown_file.has_content():
+        raise Http404('Task has no markdown')
+    return markdown_file
+
+
+@login_required
+def task_markdown_stream_view(request, pk):
+    # large lab guides: render and send one section at a time
+    markdown_file = _task_markdown_file(request, pk)
+    etag = conditional.make_etag('markdown', markdown_file.get_content_hash())
+    response = conditional.not_modified(request, etag)
+    if response is not None:
+        return response
+    response = StreamingHttpResponse(markdown_sections.iter_rendered(markdown_file),
+                                     content_type='text/html; charset=utf-8')
+    return conditional.set_validators(response, etag)
+
+
+@login_required
+def task_markdown_sections_view(request, pk):
+    markdown_file = _task_markdown_file(request, pk)
+    etag = conditional.make_etag('markdown-sections', markdown_file.get_content_hash())
+    response = conditional.not_modified(request, etag)
+    if response is not None:
+        return response
+    index = markdown_sections.get_index(markdown_file)
+    response = JsonResponse({'sections': [
+        {'number': number, 'title': title, 'size': length}
+        for number, (_, length, title) in enumerate(index)
+    ]})
+    return conditional.set_validators(response, etag)
+
+
+@login_required
+def task_markdown_section_view(request, pk, section):
+    markdown_file = _task_markdown_file(request, pk)
+    etag = conditional.make_etag('markdown-section', markdown_file.get_content_hash(), section)
+    response = conditional.not_modified(request, etag)
+    if response is not None:
+        return response
+    index = markdown_sections.get_index(markdown_file)
+    if section >= len(index):
+        raise Http404('No such section')
+    response = HttpResponse(markdown_sections.render_section(markdown_file, index, section))
+    return conditional.set_validators(response, etag)
+
+
+# token requests are answered from the token claims alone, without a user query
+STATELESS_AUTHENTICATION = [JWTStatelessUserAuthentication, SessionAuthentication]
 
 
 @api_view(['GET'])
+@authentication_classes(STATELESS_AUTHENTICATION)
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
     user = request.user
@@ -88,6 +194,38 @@ def get_user_profile(request):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def markdown_cache_stats(request):
+    return Response(markdown_cache.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def task_stats(request):
+    return Response(stats.summary(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def markdown_search(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'Error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    kind = {'original': search.KINDS[MarkdownFile], 'modified': search.KINDS[ModifiedMarkdownFile]}
+    if request.query_params.get('kind') and request.query_params['kind'] not in kind:
+        return Response({'Error': 'kind must be original or modified'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'Error': 'Invalid limit value'}, status=status.HTTP_400_BAD_REQUEST)
+    results = search.search(query, kind=kind.get(request.query_params.get('kind')), limit=max(limit, 1))
+    names = {value: name for name, value in kind.items()}
+    for result in results:
+        result['kind'] = names[result['kind']]
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
 class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in ['GET', 'HEAD', 'OPTIONS']:
@@ -96,58 +234,108 @@ class IsAdminOrReadOnly(BasePermission):
 
 
 class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+    queryset = Task.objects.select_related('assigned_to', 'submitted_file')
     serializer_class = TaskSerializer
+    authentication_classes = STATELESS_AUTHENTICATION
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TaskCursorPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Task.objects.none()
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(assigned_to_id=self.request.user.pk)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # the whole visible collection in one indexed query: any insert, update
+        # or delete changes the row count or the newest updated_at
+        version = self.get_queryset().select_related(None).aggregate(
+            count=Count('pk'), last_modified=Max('updated_at')
+        )
+        etag = conditional.make_etag('tasks', request.user.pk, users_version(), version['count'],
+                                     version['last_modified'], request.get_full_path())
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return conditional.set_validators(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        state = self.get_queryset().select_related(None).filter(pk=kwargs['pk']).values('updated_at', 'status').first()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = conditional.make_etag('task', kwargs['pk'], state['updated_at'], state['status'], users_version())
+        response = conditional.not_modified(request, etag)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return conditional.set_validators(response, etag)
 
     def create(self, request, *args, **kwargs):
         if not request.user.is_staff:
             return Response({'Error': 'only Admins can assign tasks'}, status=status.HTTP_403_FORBIDDEN)
         return super().create(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'], url_path='bulk-assign')
+    def bulk_assign(self, request):
+        if not request.user.is_staff:
+            return Response({'Error': 'only Admins can assign tasks'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = BulkAssignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = bulk_assign(**serializer.validated_data)
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post'])
+    def review(self, request):
+        if not request.user.is_staff:
+            return Response({'Error': 'only Admins can review tasks'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = BatchReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = review_tasks(serializer.validated_data['ids'], serializer.validated_data['review_status'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def _transition(self, request, pk, action, **values):
+        # the assignee and current status are checked by the UPDATE itself
+        try:
+            return transition(pk, action, assigned_to=request.user.pk, **values)
+        except InvalidTransition:
+            return None
+
     @action(detail=True, methods=['post'])
     def start(self, request, pk=None):
-        task = self.get_object()
-        if request.user != task.assigned_to:
-            return Response({'Error': 'You can only start your own assigned tasks'}, status=status.HTTP_403_FORBIDDEN)
-        task.start_task()
-        return Response({'message': 'Task started', 'status': task.status}, status=status.HTTP_200_OK)
+        state = self._transition(request, pk, 'start')
+        if state is None:
+            return Response({'Error': 'You can only start your own assigned or submitted tasks'},
+                            status=status.HTTP_403_FORBIDDEN)
+        return Response({'message': 'Task started', 'status': state['status']}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def submit(self, request, pk=None):
-        task = self.get_object()
-        if request.user != task.assigned_to:
-            return Response({'Error': 'You can only submit your own assigned tasks'}, status=status.HTTP_403_FORBIDDEN)
         try:
             time_taken = int(request.data.get('time_taken', 0))
         except ValueError:
             return Response({'Error': 'Invalid time_taken value'}, status=status.HTTP_400_BAD_REQUEST)
-        task.status = 'submitted'
-        task.time_taken = time_taken
-        task.save()
-        return Response({'message': 'Task Submitted', 'status': task.status, 'time_taken': task.time_taken},
+        state = self._transition(request, pk, 'submit', time_taken=time_taken)
+        if state is None:
+            return Response({'Error': 'You can only submit your own open tasks'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({'message': 'Task Submitted', 'status': state['status'], 'time_taken': state['time_taken']},
                         status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
-        task = self.get_object()
-        if request.user != task.assigned_to:
-            return Response({'Error': 'you can only complete your own assigned tasks'},
+        state = self._transition(request, pk, 'complete')
+        if state is None:
+            return Response({'Error': 'you can only complete your own tasks that are in progress or submitted'},
                             status=status.HTTP_403_FORBIDDEN)
-        if task.status not in ('ongoing', 'submitted'):
-            return Response({'Error': 'you can only complete tasks that are in progress or submitted'},
-                            status=status.HTTP_403_FORBIDDEN)
-        task.complete_task()
-        return Response({'message': 'Task marked as done', 'status': task.status}, status=status.HTTP_200_OK)
+        return Response({'message': 'Task marked as done', 'status': state['status']}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'])
     def fail(self, request, pk=None):
-        task = self.get_object()
-        if request.user != task.assigned_to:
-            return Response({'Error': 'you can only fail your own assigned tasks'}, status=status.HTTP_403_FORBIDDEN)
-        task.status = 'failed'
-        task.save()
-        return Response({'message': 'Task marked as failed', 'status': task.status}, status=status.HTTP_200_OK)
+        state = self._transition(request, pk, 'fail')
+        if state is None:
+            return Response({'Error': 'you can only fail your own open tasks'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({'message': 'Task marked as failed', 'status': state['status']}, status=status.HTTP_200_OK)
 
 
 class UserRegistrationViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -155,6 +343,13 @@ class UserRegistrationViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     permission_classes = [permissions.AllowAny]
     queryset = User.objects.none()
 
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except HashingPoolBusy:
+            return Response({'detail': 'Too many registrations in progress, retry shortly'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
 
 class MarkdownFileViewSet(viewsets.ModelViewSet):
     queryset = MarkdownFile.objects.all()
@@ -176,6 +371,21 @@ class ModifiedMarkdownFileViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def diff(self, request, pk=None):
+        modified = get_object_or_404(ModifiedMarkdownFile.objects.select_related('original_file'), pk=pk)
+        if not modified.has_content() or not modified.original_file.file:
+            return Response({'Error': 'Nothing to compare'}, status=status.HTTP_400_BAD_REQUEST)
+        original = modified.original_file
+        etag = conditional.make_etag('diff', original.content_hash, modified.get_content_hash())
+        response = conditional.not_modified(request, etag)
+        if response is not None:
+            return response
+        lines = deltas.iter_unified_diff(original.file, modified.get_ops(),
+                                         fromfile=original.file.name, tofile=f'modified/{modified.pk}')
+        response = StreamingHttpResponse(lines, content_type='text/x-diff; charset=utf-8')
+        return conditional.set_validators(response, etag)
+
 
 class SubmittedMarkdownFileViewSet(viewsets.ModelViewSet):
     queryset = SubmittedMarkdownFile.objects.all()